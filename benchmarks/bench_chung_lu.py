@@ -0,0 +1,34 @@
+"""
+Scaling of fast_chung_lu (skipping algorithm) against chung_lu (alias table
+sampling) for growing n at fixed average degree. Run from the repository root:
+
+    python benchmarks/bench_chung_lu.py [z] [gamma] [repeats]
+"""
+import sys
+from time import perf_counter
+import numpy as np
+from gkmerge.generators import chung_lu, fast_chung_lu
+
+
+def best_of(f, repeats):
+    times = []
+    for _ in range(repeats):
+        t = perf_counter()
+        res = f()
+        times.append(perf_counter() - t)
+    return min(times), res
+
+
+if __name__ == "__main__":
+    z = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    gamma = float(sys.argv[2]) if len(sys.argv) > 2 else 2.5
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    rng = np.random.default_rng(0)
+    print(f"z = {z}, gamma = {gamma}, times per million links in parentheses")
+    print(f"{'n':>10s} {'chung_lu':>20s} {'fast_chung_lu':>20s}")
+    for n in (10 ** 4, 10 ** 5, 10 ** 6):
+        row = f"{n:>10d}"
+        for gen in (chung_lu, fast_chung_lu):
+            t, net = best_of(lambda: gen(n, z, gamma=gamma, csr=True, rng=rng), repeats)
+            row += f" {t:9.3f} s ({t / net.number_of_links * 1e6:5.2f} s)"
+        print(row)
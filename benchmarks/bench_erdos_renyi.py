@@ -0,0 +1,67 @@
+"""
+Benchmark of fast_erdos_renyi against the scalar Batagelj-Brandes loop it
+replaced. Run from the repository root:
+
+    python benchmarks/bench_erdos_renyi.py [n] [z] [repeats]
+"""
+import math
+import random
+import sys
+from time import perf_counter
+import numpy as np
+from gkmerge.bank import Bank
+from gkmerge.network import Network
+from gkmerge.generators import fast_erdos_renyi
+
+
+def scalar_erdos_renyi(n, p):
+    """
+    Previous implementation: one random.random() and one add_or_update_link
+    call per link.
+    """
+    net = Network()
+    banks_numbered = {}
+    for i in range(n):
+        b = Bank()
+        net.add_bank(b)
+        banks_numbered[i] = b
+    u, v, logp = 0, -1, math.log(1.0 - p)
+    while u < n:
+        logr = math.log(1.0 - random.random())
+        v = v + 1 + int(logr / logp)
+        if u == v:
+            v += 1
+        while u < n <= v:
+            v = v - n
+            u = u + 1
+            if u == v:
+                v += 1
+        if u < n:
+            net.add_or_update_link(banks_numbered[u], banks_numbered[v], update_balance_sheets=False)
+    return net
+
+
+def best_of(f, repeats):
+    times = []
+    for _ in range(repeats):
+        t = perf_counter()
+        res = f()
+        times.append(perf_counter() - t)
+    return min(times), res
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    z = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    p = z / (n - 1)
+    rng = np.random.default_rng(0)
+    cases = [
+        ("scalar loop (Network)", lambda: scalar_erdos_renyi(n, p)),
+        ("fast_erdos_renyi (Network)", lambda: fast_erdos_renyi(n, p, rng=rng)),
+        ("fast_erdos_renyi (CSRNetwork)", lambda: fast_erdos_renyi(n, p, csr=True, rng=rng)),
+    ]
+    print(f"n = {n}, z = {z}, expected links = {n * (n - 1) * p:.0f}")
+    for name, f in cases:
+        t, net = best_of(f, repeats)
+        print(f"{name:32s} {t:8.3f} s  ({net.number_of_links} links)")
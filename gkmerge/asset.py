@@ -1,8 +1,18 @@
 import logging
-import math
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+
+def exp_devaluation(liquidated_fraction, alpha=1.0536):
+    """
+    Devaluation factor phi of an asset of which liquidated_fraction was
+    liquidated. Works elementwise on arrays of fractions, scalars use the same
+    numpy exp so that both give identical factors.
+    """
+    return np.exp((-alpha) * liquidated_fraction)
+
 ###################
 #                 #
 #   ASSET CLASS   #
@@ -11,6 +21,7 @@ logger = logging.getLogger(__name__)
 
 class Asset():
     asset_cnt = 0
+    __slots__ = ("id_", "_price", "phi")
 
     def __init__(self, price=1):
        self.id_ = Asset.asset_cnt
@@ -23,8 +34,7 @@ class Asset():
         return self._price * self.phi
     
     def devaluate_exp(self, liquidated_fraction):
-        alpha = 1.0536
-        f = math.exp((-alpha) * liquidated_fraction)
+        f = float(exp_devaluation(liquidated_fraction))
         self.phi = f
         return f
     
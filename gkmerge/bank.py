@@ -1,7 +1,65 @@
 import logging
+from collections.abc import MutableMapping
+from operator import attrgetter
 
 logger = logging.getLogger(__name__)
 
+BALANCE_SHEET_FIELDS = (
+    "assets_ib", "assets_e", "assets_com",
+    "liabilities_ib", "liabilities_e",
+    "shock", "shock_e"
+)
+_FIELDS = frozenset(BALANCE_SHEET_FIELDS)
+_SHOCK_FIELDS = ("shock", "shock_e")
+
+class BalanceSheet(MutableMapping):
+    """
+    Mapping view of the balance sheet fields of a bank. Keys are the
+    BALANCE_SHEET_FIELDS. With temp=True, shock and shock_e refer to the
+    pending shocks of the bank, which are the only temporary quantities.
+    Other keys are kept in a dict of the bank, as in a plain balance sheet
+    dict, and do not enter the capital.
+    """
+    __slots__ = ("_bank", "_temp")
+
+    def __init__(self, bank, temp=False):
+        self._bank = bank
+        self._temp = temp
+
+    def _attr(self, key):
+        if self._temp and key in _SHOCK_FIELDS:
+            return "pending_" + key
+        return key
+
+    def __getitem__(self, key):
+        if key not in _FIELDS:
+            return (self._bank.extra_fields or {})[key]
+        return getattr(self._bank, self._attr(key))
+
+    def __setitem__(self, key, value):
+        if key not in _FIELDS:
+            if self._bank.extra_fields is None:
+                self._bank.extra_fields = {}
+            self._bank.extra_fields[key] = value
+            return
+        setattr(self._bank, self._attr(key), value)
+
+    def __delitem__(self, key):
+        if key in _FIELDS:
+            raise TypeError("Balance sheet fields can not be removed!")
+        del (self._bank.extra_fields or {})[key]
+
+    def __iter__(self):
+        yield from BALANCE_SHEET_FIELDS
+        yield from list(self._bank.extra_fields or ())
+
+    def __len__(self):
+        return len(BALANCE_SHEET_FIELDS) + len(self._bank.extra_fields or ())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
 ##################
 #                #
 #   BANK CLASS   #
@@ -10,63 +68,107 @@ logger = logging.getLogger(__name__)
 
 class Bank():
     bank_count = 0
+    default_changes = 0 # counts changes of defaulted over all banks, see Network._liquidated_totals
+    __slots__ = (
+        "id_", "_defaulted", "temp_defaulted", *BALANCE_SHEET_FIELDS,
+        "pending_shock", "pending_shock_e", "r_val", "merge_state", "extra_fields"
+    )
 
     def __init__(self):
         self.id_ = Bank.bank_count
         Bank.bank_count += 1
 
-        self.defaulted = False
+        self._defaulted = False
         self.temp_defaulted = None
-        self.balance_sheet = dict(
-            assets_ib=0,
-            assets_e=0, # external assets NOT including common external asset
-            assets_com=0, # common external asset among banks in network
-            liabilities_ib=0,
-            liabilities_e=0, # deposits
-            # provision=0, # used to compensate capital increase
-            shock=0, # interbank network shock
-            shock_e=0 # shock to common external asset
-        )
-        self.temp_balance_sheet = None
+        self.assets_ib = 0.0
+        self.assets_e = 0.0 # external assets NOT including common external asset
+        self.assets_com = 0.0 # common external asset among banks in network
+        self.liabilities_ib = 0.0
+        self.liabilities_e = 0.0 # deposits
+        self.shock = 0.0 # interbank network shock
+        self.shock_e = 0.0 # shock to common external asset
+        # shocks committed at the end of a simultaneous step, None if not shocked
+        self.pending_shock = None
+        self.pending_shock_e = None
         self.r_val = 0 # number of banks infected by self
         self.merge_state = 0
-    
+        self.extra_fields = None # balance sheet keys other than BALANCE_SHEET_FIELDS
+
+    def _set_defaulted(self, defaulted):
+        if defaulted != self._defaulted:
+            Bank.default_changes += 1
+        self._defaulted = defaulted
+
+    defaulted = property(attrgetter("_defaulted"), _set_defaulted)
+
+    @property
+    def balance_sheet(self):
+        return BalanceSheet(self)
+
+    @balance_sheet.setter
+    def balance_sheet(self, bs):
+        for f in BALANCE_SHEET_FIELDS:
+            setattr(self, f, bs[f])
+
+    @property
+    def temp_balance_sheet(self):
+        """
+        Mapping view of the balance sheet with pending shocks, None if bank
+        has no pending shocks.
+        """
+        if self.pending_shock is None:
+            return None
+        return BalanceSheet(self, temp=True)
+
+    @temp_balance_sheet.setter
+    def temp_balance_sheet(self, bs):
+        """
+        None drops the pending shocks. A mapping sets the pending shocks to
+        its shock and shock_e and assigns its other keys to the balance sheet.
+        """
+        if bs is None:
+            self.pending_shock = None
+            self.pending_shock_e = None
+            return
+        bs = dict(bs)
+        self.pending_shock = bs.pop("shock")
+        self.pending_shock_e = bs.pop("shock_e")
+        self.balance_sheet.update(bs)
+
     def assets_tot(self, temp=False):
-        if temp:
-            bs = self.get_temp_balance_sheet()
-        else:
-            bs = self.balance_sheet
-        return bs["assets_e"] + bs["assets_ib"] + bs["assets_com"]
-    
+        # assets are never changed temporarily
+        return self.assets_e + self.assets_ib + self.assets_com
+
     def liabilities_tot(self, temp=False):
-        if temp:
-            bs = self.get_temp_balance_sheet()
-        else:
-            bs = self.balance_sheet
-        return bs["liabilities_e"] + bs["liabilities_ib"]
-    
+        return self.liabilities_e + self.liabilities_ib
+
     def shock_tot(self, temp=False):
-        if temp:
-            bs = self.get_temp_balance_sheet()
-        else:
-            bs = self.balance_sheet
-        return bs["shock_e"] + bs["shock"]
-    
+        if temp and self.pending_shock is not None:
+            return self.pending_shock_e + self.pending_shock
+        return self.shock_e + self.shock
+
     def get_temp_balance_sheet(self):
         """
-        Checks if temp_balance_sheet is set and if not set, sets it to current
-        state of balance_sheet. Returns temp_balance_sheet
+        Sets pending shocks to the current shocks if not set yet. Returns
+        temp_balance_sheet
         """
-        if self.temp_balance_sheet is None:
-            self.temp_balance_sheet = dict(self.balance_sheet)
-        return self.temp_balance_sheet
+        self._init_pending()
+        return BalanceSheet(self, temp=True)
+
+    def _init_pending(self):
+        if self.pending_shock is None:
+            self.pending_shock = self.shock
+            self.pending_shock_e = self.shock_e
 
     def capital(self, temp=False):
-        if temp and self.temp_balance_sheet is None:
-            raise ValueError("temp_balance_sheet is None!")
-        shocked_assets = self.assets_tot(temp=temp) - self.shock_tot(temp=temp)
-        liabilities = self.liabilities_tot(temp=temp)
-        return shocked_assets - liabilities
+        if temp:
+            if self.pending_shock is None:
+                raise ValueError("temp_balance_sheet is None!")
+            shock_tot = self.pending_shock_e + self.pending_shock
+        else:
+            shock_tot = self.shock_e + self.shock
+        shocked_assets = (self.assets_e + self.assets_ib + self.assets_com) - shock_tot
+        return shocked_assets - (self.liabilities_e + self.liabilities_ib)
 
     def is_solvent(self, temp=False):
         """
@@ -84,35 +186,49 @@ class Bank():
         if True, self's balance_sheet is solvent and self got no temp_balance_sheet
         or a solvent temp_balance_sheet.
         """
-        res = self.is_solvent()
-        if self.temp_balance_sheet is not None:
-            res = res and self.is_solvent(temp=True)
-        return res and not self.defaulted
+        if self._defaulted or not self.capital() > 0:
+            return False
+        return self.pending_shock is None or self.capital(temp=True) > 0
 
     def reset_temps(self):
         self.temp_defaulted = None
-        self.temp_balance_sheet = None
+        self.pending_shock = None
+        self.pending_shock_e = None
+
+    def commit_temps(self):
+        """
+        Apply temporary default state and pending shocks, then reset them.
+        """
+        if self.temp_defaulted is not None:
+            self.defaulted = self.temp_defaulted
+            self.temp_defaulted = None
+        if self.pending_shock is not None:
+            self.shock = self.pending_shock
+            self.shock_e = self.pending_shock_e
+            self.pending_shock = None
+            self.pending_shock_e = None
 
     def aggregate_shock(self):
-        bs = self.balance_sheet
-        bs["shock_e"] = bs["assets_e"] + bs["assets_com"]
+        self.shock_e = self.assets_e + self.assets_com
 
     def asset_com_shock(self, deprecation_factor, multiplicity=1, temp=False):
         if not self.shocking_required():
             return
         if temp:
-            bs = self.get_temp_balance_sheet()
+            self._init_pending()
+            curr_a_com = self.assets_com - self.pending_shock_e
+            new_a_com = curr_a_com * (1 - deprecation_factor) ** multiplicity
+            self.pending_shock_e += curr_a_com - new_a_com
         else:
-            bs = self.balance_sheet
-        curr_a_com = bs["assets_com"] - bs["shock_e"]
-        new_a_com = curr_a_com * (1 - deprecation_factor) ** multiplicity
-        bs["shock_e"] += curr_a_com - new_a_com
+            curr_a_com = self.assets_com - self.shock_e
+            new_a_com = curr_a_com * (1 - deprecation_factor) ** multiplicity
+            self.shock_e += curr_a_com - new_a_com
 
     def update_state(self, sucs_weighted, recovery_rate, mode="simultaneous"):
         """
         Update banks state if required and propagate corresponding shock to successors.
         """
-        if self.defaulted:
+        if self._defaulted:
             # defaulted bank no longer updated
             return False
         if self.is_solvent():
@@ -137,12 +253,12 @@ class Bank():
         for suc, lend in sucs_weighted:
             if not suc.shocking_required():
                 continue
-            # suc is solvent and either got no temp_bs or a solvent temp_bs
-            # init temp_balance sheet if not yet set
-            if suc.temp_balance_sheet is None:
-                suc.temp_balance_sheet = dict(suc.balance_sheet)
+            # suc is solvent and either got no pending shocks or is solvent with them
+            if suc.pending_shock is None:
+                suc.pending_shock = suc.shock
+                suc.pending_shock_e = suc.shock_e
             # transmit shock
-            suc.temp_balance_sheet["shock"] += lend * (1 - recovery_rate)
+            suc.pending_shock += lend * (1 - recovery_rate)
             if not suc.is_solvent(temp=True):
                 # r_val changed if self responsible for default of suc
                 self.r_val += 1
@@ -156,7 +272,7 @@ class Bank():
         for suc, lend in sucs_weighted:
             if not suc.shocking_required():
                 continue
-            suc.balance_sheet["shock"] += lend * (1 - recovery_rate)
+            suc.shock += lend * (1 - recovery_rate)
             if not suc.is_solvent():
                 self.r_val += 1
     
@@ -0,0 +1,318 @@
+import logging
+import heapq
+import math
+import numpy as np
+from gkmerge.bank import BALANCE_SHEET_FIELDS
+
+logger = logging.getLogger(__name__)
+
+######################
+#                    #
+#   CASCADE KERNELS  #
+#                    #
+######################
+
+# Array versions of the default cascades. Banks are integer indices into
+# CSR link arrays (ptr, idx, w) and balance sheets are (fields x n) arrays
+# with rows ordered as BALANCE_SHEET_FIELDS.
+
+_AIB, _AE, _ACOM, _LIB, _LE, _SHOCK, _SHOCKE = range(len(BALANCE_SHEET_FIELDS))
+
+
+def row_positions(ptr, rows):
+    """
+    Positions of all entries of the given csr rows, ordered by rows.
+    """
+    starts = ptr[rows]
+    lens = ptr[rows + 1] - starts
+    total = int(lens.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+    return offsets + np.arange(total)
+
+
+def simultaneous_cascade(
+    ptr, idx, w, bs, defaulted, recovery_rate=0, deprecation_factor=0,
+    active=None, defaulted_assets=0, record_profiles=False
+):
+    """
+    Vectorized version of Network._simultaneous_cascade. In each step all
+    insolvent banks default at once and their lending (times 1 - recovery_rate)
+    is scatter-added to the shocks of their successors. Works in place on
+    bs and defaulted.
+
+    Contributions are summed in bank order as in the loop version, so
+    defaulted fraction, defaulted asset fraction and step count coincide.
+    Unlike the loop version, shocks are still added to banks that are
+    already insolvent and r_val is not tracked.
+
+    Returns (steps, defaulted_assets, profile), where profile holds
+    (defaulted_assets, number of defaulted banks) after each step if
+    record_profiles is True.
+    """
+    inactive = defaulted.copy() if active is None else defaulted | ~active
+    a_tot = bs[_AE] + bs[_AIB] + bs[_ACOM]
+    l_tot = bs[_LE] + bs[_LIB]
+    shock, shock_e, a_com = bs[_SHOCK], bs[_SHOCKE], bs[_ACOM]
+    transmitted = w * (1 - recovery_rate)
+    steps, profile = 0, []
+    number_defaulted = int(np.count_nonzero(defaulted if active is None else defaulted & active))
+    while True:
+        capital = a_tot - (shock_e + shock) - l_tot
+        new = np.flatnonzero(~inactive & ~(capital > 0))
+        if len(new) == 0:
+            break
+        for a in a_tot[new].tolist():
+            defaulted_assets += a
+        pos = row_positions(ptr, new)
+        np.add.at(shock, idx[pos], transmitted[pos])
+        defaulted[new] = True
+        inactive[new] = True
+        number_defaulted += len(new)
+        if deprecation_factor > 0:
+            capital = a_tot - (shock_e + shock) - l_tot
+            shocked = np.flatnonzero(~inactive & (capital > 0))
+            curr_a_com = a_com[shocked] - shock_e[shocked]
+            new_a_com = curr_a_com * (1 - deprecation_factor) ** len(new)
+            shock_e[shocked] += curr_a_com - new_a_com
+        steps += 1
+        if record_profiles:
+            profile.append((defaulted_assets, number_defaulted))
+    return steps, defaulted_assets, profile
+
+
+def sequential_cascade(
+    ptr, idx, w, bs, defaulted, start, recovery_rate=0, deprecation_factor=0,
+    active=None, defaulted_assets=0, queued=None
+):
+    """
+    Array version of Network._sequential_cascade. Banks are popped from a
+    worklist starting at bank start; an insolvent bank defaults and its lending
+    (times 1 - recovery_rate) shocks its solvent successors, which are pushed
+    to the worklist. Only banks touched by the cascade are visited. Works in
+    place on bs and defaulted.
+
+    With deprecation_factor > 0 every default devaluates the remaining common
+    asset of all solvent banks by (1 - deprecation_factor). Devaluations are
+    applied lazily as in Network._sequential_cascade: banks are brought up to
+    date when visited, banks that can turn insolvent by devaluation alone are
+    kept in a heap keyed by the number of defaults and all banks are updated
+    at the end.
+
+    queued is an all False bool array of length n marking banks on the
+    worklist. It is all False again on return and can be reused.
+
+    Returns (number of newly defaulted banks, defaulted_assets).
+    """
+    n = bs.shape[1]
+    if queued is None:
+        queued = np.zeros(n, dtype=bool)
+    a_ib, a_e, a_com, l_ib, l_e = bs[_AIB], bs[_AE], bs[_ACOM], bs[_LIB], bs[_LE]
+    shock, shock_e = bs[_SHOCK], bs[_SHOCKE]
+    inactive = np.zeros(n, dtype=bool) if active is None else ~active
+    transmitted = w * (1 - recovery_rate)
+    factor = 1 - deprecation_factor
+    fire_sales = deprecation_factor > 0
+
+    def capital(i):
+        return (a_e[i] + a_ib[i] + a_com[i]) - (shock_e[i] + shock[i]) - (l_e[i] + l_ib[i])
+
+    if fire_sales:
+        number_defaulted = 0
+        epoch = np.zeros(n, dtype=np.int64) # number of defaults devaluated
+        # schedule banks that turn insolvent by devaluation alone
+        cap = (a_e + a_ib + a_com) - (shock_e + shock) - (l_e + l_ib)
+        curr_a_com = a_com - shock_e
+        vulnerable = np.flatnonzero(
+            ~defaulted & ~inactive & (cap > 0) & (curr_a_com > 0) & (curr_a_com >= cap)
+        )
+        heap = [(_horizon(k, a, factor), i) for k, a, i in zip(
+            cap[vulnerable].tolist(), curr_a_com[vulnerable].tolist(), vulnerable.tolist()
+        )]
+        heapq.heapify(heap)
+
+        def apply(i):
+            multiplicity = number_defaulted - epoch[i]
+            if multiplicity == 0:
+                return
+            epoch[i] = number_defaulted
+            if defaulted[i] or not capital(i) > 0:
+                return
+            curr = a_com[i] - shock_e[i]
+            shock_e[i] += curr - curr * factor ** int(multiplicity)
+
+        def schedule(i):
+            k, a = float(capital(i)), float(a_com[i] - shock_e[i])
+            if k > 0 and a > 0 and a >= k:
+                heapq.heappush(heap, (number_defaulted + _horizon(k, a, factor), i))
+
+    newly_defaulted = 0
+    stack = [start]
+    queued[start] = True
+    while stack:
+        i = stack.pop()
+        queued[i] = False
+        if defaulted[i] or inactive[i]:
+            continue
+        if fire_sales:
+            apply(i)
+        if capital(i) > 0:
+            if fire_sales:
+                schedule(i)
+            continue
+        defaulted[i] = True
+        newly_defaulted += 1
+        defaulted_assets += float(a_e[i] + a_ib[i] + a_com[i])
+        start_pos, end_pos = int(ptr[i]), int(ptr[i + 1])
+        for j, t in zip(idx[start_pos:end_pos].tolist(), transmitted[start_pos:end_pos].tolist()):
+            if defaulted[j] or inactive[j]:
+                continue
+            if fire_sales:
+                apply(j)
+            if capital(j) > 0:
+                shock[j] += t
+            if not queued[j]:
+                stack.append(j)
+                queued[j] = True
+        if fire_sales:
+            number_defaulted += 1
+            while heap and heap[0][0] <= number_defaulted:
+                _, j = heapq.heappop(heap)
+                if not queued[j]:
+                    stack.append(j)
+                    queued[j] = True
+    if fire_sales:
+        multiplicity = number_defaulted - epoch
+        cap = (a_e + a_ib + a_com) - (shock_e + shock) - (l_e + l_ib)
+        pending = np.flatnonzero(~defaulted & ~inactive & (cap > 0) & (multiplicity > 0))
+        curr = a_com[pending] - shock_e[pending]
+        shock_e[pending] += curr - curr * factor ** multiplicity[pending]
+    return newly_defaulted, defaulted_assets
+
+
+def _horizon(capital, curr_a_com, factor):
+    """
+    Number of defaults after which a bank could turn insolvent by devaluation
+    of its common asset, rounded down to be checked on time.
+    """
+    if factor <= 0 or curr_a_com == capital:
+        return 1
+    # capital - curr_a_com * (1 - factor ** k) <= 0 for k >= horizon
+    return max(1, int(math.log(1 - capital / curr_a_com) / math.log(factor)) - 1)
+
+
+def batched_simultaneous_cascade(
+    ptr, idx, w, bs, shock_banks, recovery_rate=0, deprecation_factor=0,
+    active=None, defaulted=None
+):
+    """
+    Runs K = len(shock_banks) simultaneous cascades on the same network at
+    once. Run k starts from the initial state bs, defaulted with an aggregate
+    shock to bank shock_banks[k]. Shocks and default states are kept in
+    (n x K) matrices, so memory grows as 17 * n * K bytes. The input arrays
+    are not modified.
+
+    Returns arrays (number of defaulted banks, defaulted assets, steps) of
+    length K, each run being identical to simultaneous_cascade.
+    """
+    n, runs = bs.shape[1], len(shock_banks)
+    shock_banks = np.asarray(shock_banks, dtype=np.int64)
+    cols = np.arange(runs)
+    if defaulted is None:
+        defaulted = np.zeros(n, dtype=bool)
+    inactive_bank = defaulted.copy() if active is None else defaulted | ~active
+    a_tot = (bs[_AE] + bs[_AIB] + bs[_ACOM])[:, None]
+    l_tot = (bs[_LE] + bs[_LIB])[:, None]
+    a_com = bs[_ACOM][:, None]
+    shock = np.repeat(bs[_SHOCK][:, None], runs, axis=1)
+    shock_e = np.repeat(bs[_SHOCKE][:, None], runs, axis=1)
+    shock_e[shock_banks, cols] = bs[_AE][shock_banks] + bs[_ACOM][shock_banks]
+    inactive = np.repeat(inactive_bank[:, None], runs, axis=1)
+    transmitted = w * (1 - recovery_rate)
+    number_defaulted = np.full(
+        runs, int(np.count_nonzero(defaulted if active is None else defaulted & active))
+    )
+    defaulted_assets = np.zeros(runs)
+    steps = np.zeros(runs, dtype=np.int64)
+    while True:
+        capital = a_tot - (shock_e + shock) - l_tot
+        new = ~inactive & ~(capital > 0)
+        rows, new_cols = np.nonzero(new) # ordered by bank, as in the single run kernel
+        if len(rows) == 0:
+            break
+        np.add.at(defaulted_assets, new_cols, a_tot[rows, 0])
+        pos = row_positions(ptr, rows)
+        pos_cols = np.repeat(new_cols, ptr[rows + 1] - ptr[rows])
+        np.add.at(shock, (idx[pos], pos_cols), transmitted[pos])
+        inactive |= new
+        newly_defaulted = np.count_nonzero(new, axis=0)
+        number_defaulted += newly_defaulted
+        changed = newly_defaulted > 0
+        steps += changed
+        if deprecation_factor > 0:
+            factor = np.array([(1 - deprecation_factor) ** int(k) for k in newly_defaulted])
+            capital = a_tot - (shock_e + shock) - l_tot
+            shocked_rows, shocked_cols = np.nonzero(~inactive & (capital > 0) & changed)
+            curr_a_com = a_com[shocked_rows, 0] - shock_e[shocked_rows, shocked_cols]
+            new_a_com = curr_a_com * factor[shocked_cols]
+            shock_e[shocked_rows, shocked_cols] += curr_a_com - new_a_com
+    return number_defaulted, defaulted_assets, steps
+
+
+def icc_cascade(
+    inv_ptr, inv_idx, inv_w, hold_ptr, hold_idx, hold_w, bs, defaulted, phi,
+    invested, liquidated, devaluate, active=None, defaulted_assets=0
+):
+    """
+    Vectorized version of Network.icc_cascade. Investments are a sparse
+    bank x asset matrix given as CSR arrays (inv_ptr, inv_idx, inv_w) and its
+    transpose (hold_ptr, hold_idx, hold_w), investments of each bank ordered
+    as in Network.invs_of. invested and liquidated are the running totals of
+    investments per asset. In each round all insolvent banks default at once
+    and the product of the matrix with their default mask is added to
+    liquidated. devaluate(fractions) maps the liquidated fractions of the
+    assets held by them to their new phi and the price shocks are scatter-added to the
+    external shocks of their solvent holders. Works in place on bs,
+    defaulted, phi and liquidated.
+
+    Liquidated investments are added in bank order, so liquidated fractions,
+    defaults and step counts coincide with the loop version. Unlike the loop
+    version, a bank gets the price shocks of all assets devaluated in a round,
+    even if it turns insolvent by some of them. The loop version depends on
+    the order of assets in that case, if price shocks have mixed signs (an
+    asset shocked by Network.shock_random_asset can recover).
+
+    Returns (steps, defaulted_assets, profile), where steps counts the final
+    round without defaults as in the loop version and profile holds
+    defaulted_assets after each round.
+    """
+    inactive = defaulted.copy() if active is None else defaulted | ~active
+    a_tot = bs[_AE] + bs[_AIB] + bs[_ACOM]
+    l_tot = bs[_LE] + bs[_LIB]
+    shock, shock_e = bs[_SHOCK], bs[_SHOCKE]
+    steps, profile = 0, []
+    while True:
+        steps += 1
+        capital = a_tot - (shock_e + shock) - l_tot
+        new = np.flatnonzero(~inactive & ~(capital > 0))
+        for a in a_tot[new].tolist():
+            defaulted_assets += a
+        profile.append(defaulted_assets)
+        if len(new) == 0:
+            break
+        defaulted[new] = True
+        inactive[new] = True
+        pos = row_positions(inv_ptr, new)
+        np.add.at(liquidated, inv_idx[pos], inv_w[pos])
+        assets = np.unique(inv_idx[pos])
+        phi_curr = phi[assets]
+        phi_new = devaluate(liquidated[assets] / invested[assets])
+        phi[assets] = phi_new
+        pos = row_positions(hold_ptr, assets)
+        asset_rows = np.repeat(np.arange(len(assets)), hold_ptr[assets + 1] - hold_ptr[assets])
+        holders, w = hold_idx[pos], hold_w[pos]
+        shocked = ~inactive[holders]
+        new_shock = w * phi_curr[asset_rows] - w * phi_new[asset_rows]
+        np.add.at(shock_e, holders[shocked], new_shock[shocked])
+    return steps, defaulted_assets, profile
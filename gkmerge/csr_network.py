@@ -0,0 +1,564 @@
+import logging
+from collections import Counter
+from operator import attrgetter
+import numpy as np
+from gkmerge.bank import BALANCE_SHEET_FIELDS
+from gkmerge.cascade import simultaneous_cascade, sequential_cascade, batched_simultaneous_cascade
+from gkmerge.util import randrange
+
+logger = logging.getLogger(__name__)
+
+#########################
+#                       #
+#   CSR NETWORK CLASS   #
+#                       #
+#########################
+
+BS_INDEX = {f: i for i, f in enumerate(BALANCE_SHEET_FIELDS)}
+
+
+class CSRNetwork():
+    """
+    Compact array backed counterpart of Network. Banks are integer indices
+    0, ..., n - 1 and links are stored as CSR arrays (successor offsets,
+    successor indices, float64 weights). The predecessor (CSC) index is built
+    on demand. Balance sheets are stored field-wise in one (fields x n) array.
+
+    Links added or removed one at a time are buffered and merged into the CSR
+    arrays on the next structural query, so bulk construction should go
+    through from_edges.
+    """
+    def __init__(self, n=0):
+        self.balance_sheets = np.zeros((len(BALANCE_SHEET_FIELDS), n))
+        self.defaulted = np.zeros(n, dtype=bool)
+        self.merge_state = np.zeros(n, dtype=np.int64)
+        self._alive = np.ones(n, dtype=bool)
+        self._number_of_banks = n
+        self._suc_ptr = np.zeros(n + 1, dtype=np.int64)
+        self._suc_idx = np.zeros(0, dtype=np.int64)
+        self._suc_w = np.zeros(0)
+        self._pre = None # (pre_ptr, pre_idx, pre_pos) with pre_pos pointing into csr arrays
+        self._added = {} # stores {(u, v): weight} for links not yet in csr arrays
+        self._removed = set() # stores {(u, v)} for links still in csr arrays
+        self._dead_links = False # csr arrays hold links of removed banks
+        self._queued = None # worklist bitmap of the sequential cascade
+        self.number_of_links = 0
+
+        self.simultaneous_cascade_steps = None
+        self.merge_round = 0
+        self.df_over_time = []
+        self.init_system_assets = 0
+        self.defaulted_system_assets = 0
+        self.system_assets_over_time = []
+
+    @classmethod
+    def from_edges(cls, n, u, v, weight=None):
+        """
+        Create network of n banks from link arrays u -> v. Links must be
+        unique and must not contain selfloops.
+        """
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        w = np.zeros(len(u)) if weight is None else np.asarray(weight, dtype=np.float64)
+        if not len(u) == len(v) == len(w):
+            raise ValueError("Link arrays must be of the same length!")
+        if len(u) > 0 and (min(u.min(), v.min()) < 0 or max(u.max(), v.max()) >= n):
+            raise ValueError(f"Link arrays contain banks not in network of size {n}!")
+        if np.any(u == v):
+            raise ValueError("Selfloops are not supported!")
+        net = cls(n)
+        keys = u * n + v
+        order = np.argsort(keys, kind="stable")
+        if np.any(np.diff(keys[order]) == 0):
+            raise ValueError("Link arrays contain duplicate links!")
+        net._suc_idx = v[order]
+        net._suc_w = w[order]
+        net._suc_ptr[1:] = np.cumsum(np.bincount(u, minlength=n))
+        net.number_of_links = len(u)
+        return net
+
+    @classmethod
+    def from_network(cls, network):
+        """
+        Create array copy of a Network. Bank i of the copy is the i-th bank
+        when iterating network.banks.
+        """
+        banks = list(network.banks)
+        index = {b: i for i, b in enumerate(banks)}
+        u, v, w = [], [], []
+        for b in banks:
+            for suc, weight in network.sucs_of(b, weight=True):
+                u.append(index[b])
+                v.append(index[suc])
+                w.append(weight)
+        net = cls.from_edges(len(banks), u, v, w)
+        net.load_state(network, banks)
+        return net
+
+    def load_state(self, network, banks):
+        """
+        Copy balance sheets, default flags, merge states and cascade totals
+        of a Network with the banks of this copy (see from_network).
+        """
+        n = len(banks)
+        for i, f in enumerate(BALANCE_SHEET_FIELDS):
+            self.balance_sheets[i] = np.fromiter(map(attrgetter(f), banks), dtype=np.float64, count=n)
+        self.defaulted[:] = np.fromiter(map(attrgetter("defaulted"), banks), dtype=bool, count=n)
+        self.merge_state[:] = np.fromiter(map(attrgetter("merge_state"), banks), dtype=np.int64, count=n)
+        self.init_system_assets = network.init_system_assets
+        self.defaulted_system_assets = network.defaulted_system_assets
+        self.merge_round = network.merge_round
+
+    @property
+    def number_of_banks(self):
+        return self._number_of_banks
+
+    @property
+    def banks(self):
+        return np.flatnonzero(self._alive)
+
+    @property
+    def links(self):
+        u, v, _ = self.link_arrays()
+        return list(zip(u.tolist(), v.tolist()))
+
+    def field(self, name):
+        """
+        Returns writable view on balance sheet field name of all banks.
+        """
+        return self.balance_sheets[BS_INDEX[name]]
+
+    def balance_sheet_of(self, bank):
+        self._check_bank(bank)
+        return {f: float(self.balance_sheets[i, bank]) for i, f in enumerate(BALANCE_SHEET_FIELDS)}
+
+    def link_arrays(self):
+        """
+        Returns link arrays (u, v, weight) in csr order.
+        """
+        self._flush()
+        u = np.repeat(np.arange(len(self._alive)), np.diff(self._suc_ptr))
+        return u, self._suc_idx, self._suc_w
+
+    def set_link_weights(self, weights, update_balance_sheets=True):
+        """
+        Set weights of all links in csr order (see link_arrays).
+        """
+        u, v, w_curr = self.link_arrays()
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(w_curr):
+            raise ValueError(f"Expected {len(w_curr)} weights, not {len(weights)}!")
+        if update_balance_sheets:
+            dw = weights - w_curr
+            np.add.at(self.field("liabilities_ib"), u, dw)
+            np.add.at(self.field("assets_ib"), v, dw)
+        self._suc_w = weights.copy()
+
+    def add_bank(self):
+        """
+        Add a bank to the network and return its index.
+        """
+        n = len(self._alive)
+        self.balance_sheets = np.concatenate(
+            (self.balance_sheets, np.zeros((len(BALANCE_SHEET_FIELDS), 1))), axis=1
+        )
+        self.defaulted = np.append(self.defaulted, False)
+        self.merge_state = np.append(self.merge_state, 0)
+        self._alive = np.append(self._alive, True)
+        self._suc_ptr = np.append(self._suc_ptr, self._suc_ptr[-1])
+        self._pre = None
+        self._number_of_banks += 1
+        return n
+
+    def add_banks(self, k):
+        return [self.add_bank() for _ in range(k)]
+
+    def remove_bank(self, bank, update_balance_sheets=True):
+        self._check_bank(bank)
+        self._flush()
+        if update_balance_sheets:
+            pres, pre_w = self._pres_weighted(bank)
+            sucs, suc_w = self._sucs_weighted(bank)
+            np.subtract.at(self.field("liabilities_ib"), pres, pre_w)
+            np.subtract.at(self.field("assets_ib"), sucs, suc_w)
+        self.number_of_links -= self.in_deg_of(bank) + self.out_deg_of(bank)
+        self._alive[bank] = False
+        self._number_of_banks -= 1
+        self._dead_links = True
+
+    def remove_banks_from(self, banks):
+        for b in banks:
+            self.remove_bank(b)
+
+    def add_or_update_link(self, u, v, weight=0, update_balance_sheets=True):
+        """
+        Adds a link or updates its weight if link already in network.
+        If update_balance_sheets is True, interbank positions in balance sheets
+        will also be updated.
+        """
+        if u == v:
+            raise ValueError("Selfloops are not supported!")
+        if not (self._is_alive(u) and self._is_alive(v)):
+            raise ValueError(f"Bank(s) from link ({u}, {v}) not in network!")
+        j = self._find(u, v)
+        if j >= 0:
+            curr_weight = self._suc_w[j]
+            self._suc_w[j] = weight
+        elif (u, v) in self._added:
+            curr_weight = self._added[(u, v)]
+            self._added[(u, v)] = weight
+        elif (u, v) in self._removed:
+            # link still in csr arrays, revive it
+            curr_weight = 0
+            self._removed.discard((u, v))
+            self._suc_w[self._find(u, v, removed=True)] = weight
+            self.number_of_links += 1
+        else:
+            curr_weight = 0
+            self._added[(u, v)] = weight
+            self.number_of_links += 1
+        if update_balance_sheets:
+            self.balance_sheets[BS_INDEX["liabilities_ib"], u] += weight - curr_weight
+            self.balance_sheets[BS_INDEX["assets_ib"], v] += weight - curr_weight
+
+    add_link = add_or_update_link
+
+    def remove_link(self, u, v, update_balance_sheets=True):
+        j = self._find(u, v)
+        if j >= 0:
+            weight = self._suc_w[j]
+            self._removed.add((u, v))
+        elif (u, v) in self._added:
+            weight = self._added.pop((u, v))
+        else:
+            raise ValueError(f"Link ({u}, {v}) is not in network!")
+        if update_balance_sheets:
+            self.balance_sheets[BS_INDEX["liabilities_ib"], u] -= weight
+            self.balance_sheets[BS_INDEX["assets_ib"], v] -= weight
+        self.number_of_links -= 1
+
+    def get_link_weight(self, u, v):
+        j = self._find(u, v)
+        if j >= 0:
+            return float(self._suc_w[j])
+        if (u, v) in self._added:
+            return self._added[(u, v)]
+        raise ValueError(f"Link ({u}, {v}) is not in network!")
+
+    def sucs_of(self, bank, weight=False):
+        sucs, w = self._sucs_weighted(bank)
+        if weight:
+            return list(zip(sucs.tolist(), w.tolist()))
+        return sucs
+
+    def pres_of(self, bank, weight=False):
+        pres, w = self._pres_weighted(bank)
+        if weight:
+            return list(zip(pres.tolist(), w.tolist()))
+        return pres
+
+    def is_suc(self, bank, suc):
+        self._check_bank(bank)
+        return (bank, suc) in self._added or self._find(bank, suc) >= 0
+
+    def is_pre(self, bank, pre):
+        return self.is_suc(pre, bank)
+
+    def out_deg_of(self, bank):
+        self._check_bank(bank)
+        self._flush()
+        return int(self._suc_ptr[bank + 1] - self._suc_ptr[bank])
+
+    def in_deg_of(self, bank):
+        self._check_bank(bank)
+        pre_ptr, _, _ = self._pre_index()
+        return int(pre_ptr[bank + 1] - pre_ptr[bank])
+
+    def out_degrees(self):
+        """
+        Out-degree of all bank indices, removed banks have degree 0.
+        """
+        self._flush()
+        return np.diff(self._suc_ptr)
+
+    def in_degrees(self):
+        """
+        In-degree of all bank indices, removed banks have degree 0.
+        """
+        pre_ptr, _, _ = self._pre_index()
+        return np.diff(pre_ptr)
+
+    def get_largest(self):
+        ms = np.where(self._alive, self.merge_state, -1)
+        return int(np.argmax(ms))
+
+    def get_highest_in_deg(self):
+        return int(np.argmax(np.where(self._alive, self.in_degrees(), -1)))
+
+    def get_highest_out_deg(self):
+        return int(np.argmax(np.where(self._alive, self.out_degrees(), -1)))
+
+    def get_kth_highest_in_deg(self, k):
+        banks = self.banks
+        return int(banks[np.argsort(self.in_degrees()[banks], kind="stable")[-k]])
+
+    def get_kth_highest_out_deg(self, k):
+        banks = self.banks
+        return int(banks[np.argsort(self.out_degrees()[banks], kind="stable")[-k]])
+
+    def assets_tot(self):
+        bs = self.balance_sheets
+        return bs[BS_INDEX["assets_e"]] + bs[BS_INDEX["assets_ib"]] + bs[BS_INDEX["assets_com"]]
+
+    def liabilities_tot(self):
+        bs = self.balance_sheets
+        return bs[BS_INDEX["liabilities_e"]] + bs[BS_INDEX["liabilities_ib"]]
+
+    def shock_tot(self):
+        bs = self.balance_sheets
+        return bs[BS_INDEX["shock_e"]] + bs[BS_INDEX["shock"]]
+
+    def capital(self):
+        return self.assets_tot() - self.shock_tot() - self.liabilities_tot()
+
+    def aggregate_shock(self, bank):
+        bs = self.balance_sheets
+        bs[BS_INDEX["shock_e"], bank] = bs[BS_INDEX["assets_e"], bank] + bs[BS_INDEX["assets_com"], bank]
+
+    def shock_random(self, rng=None):
+        b = int(self.banks[randrange(self.number_of_banks, rng)])
+        self.aggregate_shock(b)
+        return b
+
+    def shock_largest(self):
+        b = self.get_largest()
+        self.aggregate_shock(b)
+        return b
+
+    def shock_max_in_deg(self):
+        b = self.get_highest_in_deg()
+        self.aggregate_shock(b)
+        return b
+
+    def shock_kth_in_deg(self, k):
+        b = self.get_kth_highest_in_deg(k)
+        self.aggregate_shock(b)
+        return b
+
+    def cascade(
+        self, init_shock_bank=None, mode="simultaneous",
+        recovery_rate=0, deprecation_factor=0, record_profiles=False
+    ):
+        """
+        Calculate default cascade upon initial shock. Update mode specifies
+        order of bank updates:
+            - 'simultaneous':   Update in timesteps, vectorized over all banks
+                                (see cascade.simultaneous_cascade). 'vectorized'
+                                is accepted as an alias.
+            - 'sequential':     Worklist cascade starting at init_shock_bank
+                                (see cascade.sequential_cascade).
+        """
+        if mode == "sequential":
+            self._sequential_cascade(init_shock_bank, recovery_rate, deprecation_factor)
+            return
+        if mode not in ("simultaneous", "vectorized"):
+            raise ValueError(f"Update mode '{mode}' is unknown!")
+        self._flush()
+        if record_profiles:
+            self.system_assets_over_time.append(self.init_system_assets)
+        steps, self.defaulted_system_assets, profile = simultaneous_cascade(
+            self._suc_ptr, self._suc_idx, self._suc_w, self.balance_sheets, self.defaulted,
+            recovery_rate=recovery_rate, deprecation_factor=deprecation_factor,
+            active=self._alive, defaulted_assets=self.defaulted_system_assets,
+            record_profiles=record_profiles
+        )
+        for defaulted_assets, number_defaulted in profile:
+            self.system_assets_over_time.append(self.init_system_assets - defaulted_assets)
+            self.df_over_time.append(number_defaulted / self.number_of_banks)
+        self.simultaneous_cascade_steps = steps
+
+    def _sequential_cascade(self, init_shock_bank, recovery_rate, deprecation_factor):
+        if init_shock_bank is None:
+            raise ValueError("Sequential cascade requires init_shock_bank!")
+        self._check_bank(init_shock_bank)
+        self._flush()
+        n = len(self._alive)
+        if self._queued is None or len(self._queued) != n:
+            self._queued = np.zeros(n, dtype=bool)
+        _, self.defaulted_system_assets = sequential_cascade(
+            self._suc_ptr, self._suc_idx, self._suc_w, self.balance_sheets, self.defaulted,
+            init_shock_bank, recovery_rate=recovery_rate, deprecation_factor=deprecation_factor,
+            active=self._alive, defaulted_assets=self.defaulted_system_assets, queued=self._queued
+        )
+
+    def batched_cascade(
+        self, shock_banks="random", runs=1, recovery_rate=0, deprecation_factor=0, rng=None
+    ):
+        """
+        Simultaneous cascades upon the initial shock of several banks, computed
+        at once (see cascade.batched_simultaneous_cascade). shock_banks is either
+        'random' (runs banks drawn with replacement from rng), 'max_in_deg' or a
+        list of banks. The state of the network is not modified.
+        Returns dict of arrays df, af and steps with one entry per run.
+        """
+        if isinstance(shock_banks, str):
+            if shock_banks == "random":
+                banks = self.banks
+                shock_banks = banks[[randrange(len(banks), rng) for _ in range(runs)]]
+            elif shock_banks == "max_in_deg":
+                shock_banks = [self.get_highest_in_deg()] * runs
+            else:
+                raise ValueError(f"Unknown shock mode '{shock_banks}'!")
+        for b in shock_banks:
+            self._check_bank(b)
+        self._flush()
+        number_defaulted, defaulted_assets, steps = batched_simultaneous_cascade(
+            self._suc_ptr, self._suc_idx, self._suc_w, self.balance_sheets, shock_banks,
+            recovery_rate=recovery_rate, deprecation_factor=deprecation_factor,
+            active=self._alive, defaulted=self.defaulted
+        )
+        defaulted_assets += self.defaulted_system_assets
+        ia = self.init_system_assets
+        return dict(
+            df=number_defaulted / self.number_of_banks,
+            af=defaulted_assets / ia if ia > 0 else np.zeros(len(steps)),
+            steps=steps
+        )
+
+    def snapshot_state(self):
+        """
+        Returns a token of the current cascade state (balance sheets, default
+        flags and cascade records), see restore_state. Network has no
+        snapshots, as the state of its banks is not held in arrays.
+        """
+        return dict(
+            balance_sheets=self.balance_sheets.copy(),
+            defaulted=self.defaulted.copy(),
+            alive=self._alive.copy(),
+            records=(
+                self.simultaneous_cascade_steps, self.defaulted_system_assets,
+                list(self.system_assets_over_time), list(self.df_over_time)
+            )
+        )
+
+    def restore_state(self, token):
+        """
+        Restore the cascade state of a token from snapshot_state with a single
+        copy of the state arrays. Banks must not be added or removed in between.
+        """
+        if not np.array_equal(token["alive"], self._alive):
+            raise ValueError("Banks of network changed since snapshot!")
+        np.copyto(self.balance_sheets, token["balance_sheets"])
+        np.copyto(self.defaulted, token["defaulted"])
+        steps, defaulted_assets, system_assets_over_time, df_over_time = token["records"]
+        self.simultaneous_cascade_steps = steps
+        self.defaulted_system_assets = defaulted_assets
+        self.system_assets_over_time = list(system_assets_over_time)
+        self.df_over_time = list(df_over_time)
+
+    def reset_cascade(self):
+        self.defaulted[:] = False
+        self.field("shock")[:] = 0
+        self.field("shock_e")[:] = 0
+        self.simultaneous_cascade_steps = None
+        self.defaulted_system_assets = 0
+        self.system_assets_over_time = []
+        self.df_over_time = []
+
+    def defaulted_fraction(self):
+        return int(np.count_nonzero(self.defaulted & self._alive)) / self.number_of_banks
+
+    def defaulted_asset_fraction(self):
+        ia = self.init_system_assets
+        return self.defaulted_system_assets / ia if ia > 0 else 0
+
+    def z(self):
+        """
+        Mean in-/out-degree of the network.
+        """
+        return self.number_of_links / self.number_of_banks
+
+    def in_deg_distr(self):
+        c = Counter(self.in_degrees()[self._alive].tolist())
+        return list(c.keys()), list(c.values())
+
+    def out_deg_distr(self):
+        c = Counter(self.out_degrees()[self._alive].tolist())
+        return list(c.keys()), list(c.values())
+
+    def merge_state_distr(self):
+        return Counter(self.merge_state[self._alive].tolist())
+
+    def _is_alive(self, bank):
+        return 0 <= bank < len(self._alive) and self._alive[bank]
+
+    def _check_bank(self, bank):
+        if not self._is_alive(bank):
+            raise ValueError(f"Bank with index {bank} is not in network!")
+
+    def _find(self, u, v, removed=False):
+        """
+        Position of link (u, v) in csr arrays or -1. Links buffered for
+        removal are only found if removed is True.
+        """
+        if not (self._is_alive(u) and self._is_alive(v)):
+            return -1
+        if not removed and (u, v) in self._removed:
+            return -1
+        lo, hi = self._suc_ptr[u], self._suc_ptr[u + 1]
+        j = lo + np.searchsorted(self._suc_idx[lo:hi], v)
+        if j < hi and self._suc_idx[j] == v:
+            return int(j)
+        return -1
+
+    def _sucs_weighted(self, bank):
+        self._check_bank(bank)
+        self._flush()
+        lo, hi = self._suc_ptr[bank], self._suc_ptr[bank + 1]
+        return self._suc_idx[lo:hi], self._suc_w[lo:hi]
+
+    def _pres_weighted(self, bank):
+        self._check_bank(bank)
+        pre_ptr, pre_idx, pre_pos = self._pre_index()
+        lo, hi = pre_ptr[bank], pre_ptr[bank + 1]
+        return pre_idx[lo:hi], self._suc_w[pre_pos[lo:hi]]
+
+    def _pre_index(self):
+        self._flush()
+        if self._pre is None:
+            n = len(self._alive)
+            u = np.repeat(np.arange(n), np.diff(self._suc_ptr))
+            pre_pos = np.argsort(self._suc_idx, kind="stable")
+            pre_ptr = np.zeros(n + 1, dtype=np.int64)
+            pre_ptr[1:] = np.cumsum(np.bincount(self._suc_idx, minlength=n))
+            self._pre = (pre_ptr, u[pre_pos], pre_pos)
+        return self._pre
+
+    def _flush(self):
+        """
+        Merge buffered link changes into the csr arrays.
+        """
+        if not (self._added or self._removed or self._dead_links):
+            return
+        n = len(self._alive)
+        u = np.repeat(np.arange(n), np.diff(self._suc_ptr))
+        v, w = self._suc_idx, self._suc_w
+        keep = self._alive[u] & self._alive[v]
+        if self._removed:
+            removed = np.array([ru * n + rv for ru, rv in self._removed], dtype=np.int64)
+            keep &= ~np.isin(u * n + v, removed)
+        u, v, w = u[keep], v[keep], w[keep]
+        if self._added:
+            added = [(au, av, aw) for (au, av), aw in self._added.items()
+                     if self._alive[au] and self._alive[av]]
+            if added:
+                au, av, aw = (np.array(x) for x in zip(*added))
+                u = np.concatenate((u, au.astype(np.int64)))
+                v = np.concatenate((v, av.astype(np.int64)))
+                w = np.concatenate((w, aw.astype(np.float64)))
+        order = np.argsort(u * n + v, kind="stable")
+        self._suc_idx, self._suc_w = v[order], w[order]
+        self._suc_ptr = np.zeros(n + 1, dtype=np.int64)
+        self._suc_ptr[1:] = np.cumsum(np.bincount(u, minlength=n))
+        self._added, self._removed, self._dead_links = {}, set(), False
+        self._pre = None
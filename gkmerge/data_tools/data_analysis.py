@@ -11,7 +11,7 @@ def contagion_extend(df_or_af_lst, cascade_threshold):
 
 
 def cascade_steps(steps_lst, df_or_af_lst, cascade_threshold):
-    return externally_filtered_mean(steps_lst, df_or_af_lst, lambda df: df > cascade_threshold)
+    return vectorized_externally_filtered_mean(steps_lst, df_or_af_lst, lambda df: df > cascade_threshold)
 
 
 def contagion_frequency(df_or_af_lst, cascade_threshold):
@@ -20,8 +20,51 @@ def contagion_frequency(df_or_af_lst, cascade_threshold):
     calculates the contagion frequency among the runs, where a global cascade
     is defined accoring to cadcade_threshold.
     """
-    return fraction(df_or_af_lst, lambda df: df > cascade_threshold)
+    return vectorized_fraction(df_or_af_lst, lambda df: df > cascade_threshold)
 
 
 def mean_degree(z_lst):
     return mean(z_lst)
+
+
+def cascade_statistics(df_or_af, cascade_thresholds, ids=None, steps=None, number_of_groups=None):
+    """
+    contagion_frequency, contagion_extend and, if steps is given,
+    cascade_steps of all groups of runs for all cascade_thresholds at once.
+    ids[i] is the group of run i in range(number_of_groups), e.g. from
+    group_ids, all runs form one group if ids is None. NaN values count as
+    missing. Returns dict of arrays of shape (groups, thresholds) with keys
+    frequency, extend and steps.
+    """
+    a, valid = valid_values(df_or_af)
+    t = np.atleast_1d(np.asarray(cascade_thresholds, dtype=float))
+    ids = np.zeros(len(a), dtype=int) if ids is None else np.asarray(ids)
+    if number_of_groups is None:
+        number_of_groups = int(ids.max()) + 1 if len(ids) > 0 else 0
+    a, ids = a[valid], ids[valid]
+    if steps is not None:
+        s, s_valid = valid_values(steps)
+        s, s_valid = s[valid], s_valid[valid]
+        s = np.where(s_valid, s, 0)
+    # grouped counts and sums of the runs above each threshold
+    shape = (len(t), number_of_groups)
+    n_runs = np.bincount(ids, minlength=number_of_groups)
+    n_above, a_above = np.zeros(shape), np.zeros(shape)
+    if steps is not None:
+        n_steps, s_above = np.zeros(shape), np.zeros(shape)
+    for j, threshold in enumerate(t.tolist()):
+        above = a > threshold
+        ids_above = ids[above]
+        n_above[j] = np.bincount(ids_above, minlength=number_of_groups)
+        a_above[j] = np.bincount(ids_above, weights=a[above], minlength=number_of_groups)
+        if steps is not None:
+            n_steps[j] = np.bincount(ids_above, weights=s_valid[above], minlength=number_of_groups)
+            s_above[j] = np.bincount(ids_above, weights=s[above], minlength=number_of_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stats = dict(
+            frequency=np.where(n_runs > 0, n_above / n_runs, 0).T,
+            extend=np.where(n_above > 0, a_above / n_above, 0).T
+        )
+        if steps is not None:
+            stats.update(steps=np.where(n_steps > 0, s_above / n_steps, 0).T)
+    return stats
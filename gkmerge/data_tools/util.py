@@ -1,12 +1,63 @@
+import os
+import json
 import numpy as np
 
 
+def load_columns(path, mmap_mode="r"):
+    """
+    Loads the columnar data written by simulation.write_columns from the
+    directory path. Returns (meta, columns) with columns {field: array},
+    memory-mapped unless mmap_mode is None.
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    columns = {
+        f: np.load(os.path.join(path, f"{f}.npy"), mmap_mode=mmap_mode) for f in meta["fields"]
+    }
+    return meta, columns
+
+
+def key_slices(meta):
+    """
+    Returns {data key: slice of its runs in the columns}.
+    """
+    o = meta["offsets"]
+    return {k: slice(o[i], o[i + 1]) for i, k in enumerate(meta["keys"])}
+
+
+def group_ids(meta):
+    """
+    Returns (keys, ids) where ids[i] is the index in keys of the data key of
+    run i of the columns.
+    """
+    counts = np.diff(meta["offsets"])
+    return meta["keys"], np.repeat(np.arange(len(counts)), counts)
+
+
+def per_key(func, meta, *columns, **kwargs):
+    """
+    Applies func to the runs of each data key, e.g.
+    per_key(contagion_frequency, meta, columns["df"], cascade_threshold=0.05).
+    Slices of memory-mapped columns are read on access only.
+    Returns {data key: result}.
+    """
+    return {k: func(*(c[s] for c in columns), **kwargs) for k, s in key_slices(meta).items()}
+
+
+def valid_values(lst):
+    """
+    Array of lst with None as NaN and mask of the values that are not NaN.
+    """
+    a = np.asarray(lst, dtype=float)
+    return a, ~np.isnan(a)
+
+
 def mean(lst):
     """
-    Clears the given list of None and calculates the mean
+    Clears the given list of None (or NaN) and calculates the mean
     """
-    lst = [elem for elem in lst if elem is not None]
-    return np.mean(np.array(lst)) if len(lst) > 0 else 0
+    a, valid = valid_values(lst)
+    return np.mean(a[valid]) if valid.any() else 0
 
 
 def std(lst):
@@ -18,8 +69,8 @@ def greater_than(val, cond=0):
 
 
 def filtered_mean(lst, filter_func):
-    a = np.array(lst)
-    a = a[filter_func(a)]
+    a, valid = valid_values(lst)
+    a = a[valid & filter_func(a)]
     return np.mean(a) if len(a) > 0 else 0
 
 
@@ -27,23 +78,45 @@ def externally_filtered_mean(lst, filter_lst, filter_func):
     """
     Returns the conditional mean of the list after clearing it from None
     E.g. a value in lst at pos i is counted to the mean if and only if
-    condition(condition_lst[i]) is true. Give keyworded args of condition function as kwargs.
+    condition(condition_lst[i]) is true. filter_func is called with single
+    values of filter_lst, see vectorized_externally_filtered_mean.
+    """
+    if len(lst) != len(filter_lst):
+        raise ValueError("lst and condition_lst must be of the same length!")
+    cond = np.fromiter(map(filter_func, filter_lst), dtype=bool, count=len(filter_lst))
+    a, valid = valid_values(lst)
+    valid &= cond
+    return np.mean(a[valid]) if valid.any() else 0
+
+
+def vectorized_externally_filtered_mean(lst, filter_lst, filter_func):
+    """
+    As externally_filtered_mean, but filter_func is applied to the array of
+    filter_lst at once (None as NaN).
     """
     if len(lst) != len(filter_lst):
         raise ValueError("lst and condition_lst must be of the same length!")
-    cond_corr_lst = []
-    for i, elem in enumerate(lst):
-        if filter_func(filter_lst[i]):
-            cond_corr_lst.append(elem)
-    cond_corr_lst = [elem for elem in cond_corr_lst if elem is not None]
-    return np.mean(np.array(cond_corr_lst)) if len(cond_corr_lst) > 0 else 0
+    a, valid = valid_values(lst)
+    valid &= filter_func(np.asarray(filter_lst, dtype=float))
+    return np.mean(a[valid]) if valid.any() else 0
 
 
 def fraction(lst, frac_func):
-    lst = [elem for elem in lst if elem is not None]
-    cond_cnt, tot_cnt = 0, 0
-    for elem in lst:
-        tot_cnt += 1
-        if frac_func(elem):
-            cond_cnt += 1
-    return cond_cnt / tot_cnt if tot_cnt > 0 else 0
+    """
+    Fraction of the values in lst, cleared of None (or NaN), for which
+    frac_func is true. frac_func is called with single values, see
+    vectorized_fraction.
+    """
+    _, valid = valid_values(lst)
+    lst = [elem for elem, v in zip(lst, valid.tolist()) if v]
+    cond_cnt = sum(1 for elem in lst if frac_func(elem))
+    return cond_cnt / len(lst) if len(lst) > 0 else 0
+
+
+def vectorized_fraction(lst, frac_func):
+    """
+    As fraction, but frac_func is applied to the array of values at once.
+    """
+    a, valid = valid_values(lst)
+    tot_cnt = np.count_nonzero(valid)
+    return np.count_nonzero(frac_func(a[valid])) / tot_cnt if tot_cnt > 0 else 0
@@ -6,12 +6,15 @@ import numpy as np
 from itertools import permutations
 from randomdict import RandomDict
 from gkmerge.network import Network
+from gkmerge.csr_network import CSRNetwork
 from gkmerge.bank import Bank
 from gkmerge.asset import Asset
-from gkmerge.util import random_subset
 
 logger = logging.getLogger(__name__)
 
+# Random generators take an optional numpy Generator rng. Without it, the
+# global states of the random module and np.random are used.
+
 __all__ = [
     "unlinked",
     "complete",
@@ -21,6 +24,7 @@ __all__ = [
     "bipartite_erdos_renyi",
     "fast_bipartite_erdos_renyi",
     "chung_lu",
+    "fast_chung_lu",
     "from_unique_id_link_list",
     "init_balance_sheets_dcc",
     "init_balance_sheets_icc"
@@ -28,49 +32,101 @@ __all__ = [
 
 
 def init_balance_sheets_dcc(network, alpha, kappa, c):
-    for b in network.banks:
-        in_deg = network.in_deg_of(b)
-        out_deg = network.out_deg_of(b)
-        if in_deg + out_deg > 0:
-            a_tot = (in_deg + out_deg + max(out_deg - in_deg, 0)) * 100 / 2 # linear relation
-            a_ib = a_tot * alpha if in_deg > 0 else 0
-            a_ib_per_pre = a_ib / in_deg if in_deg > 0 else 0
-        else:
-            a_tot = 100
-            a_ib = 0
-            a_ib_per_pre = 0
-        a_not_ib = a_tot - a_ib # total non-interbank assets (external + common)
-        a_com = a_not_ib * c
-        b.balance_sheet["assets_e"] = a_not_ib - a_com
-        b.balance_sheet["assets_com"] = a_com
-        for pre in network.pres_of(b):
-            network.add_or_update_link(pre, b, weight=a_ib_per_pre)
-    for b in network.banks:
-        a_tot = b.assets_tot()
-        network.init_system_assets += a_tot
-        l_ib = b.balance_sheet["liabilities_ib"]
-        k = a_tot * kappa
-        b.balance_sheet["liabilities_e"] = a_tot - l_ib - k
+    """
+    Degree dependent balance sheets: total assets grow linearly with the degree,
+    a fraction alpha of them is lent in equal parts to the predecessors, a
+    fraction c of the remaining assets is the common external asset and the
+    capital is a fraction kappa of total assets.
+    Computed on arrays over all banks, with floating point results (including
+    init_system_assets) identical to updating bank by bank.
+    """
+    if isinstance(network, CSRNetwork):
+        _init_balance_sheets_dcc_csr(network, alpha, kappa, c)
+        return
+    banks = list(network.banks)
+    n = len(banks)
+    u, v, w_curr = network.pre_link_arrays(banks)
+    in_deg, out_deg = np.bincount(v, minlength=n), np.bincount(u, minlength=n)
+    a_ib_per_pre, assets_e, assets_com = _dcc_assets(in_deg, out_deg, alpha, c)
+    # interbank positions are summed in the order of link updates by target bank
+    weights = a_ib_per_pre[v]
+    dw = weights - w_curr
+    assets_ib = np.array([b.assets_ib for b in banks], dtype=np.float64)
+    liabilities_ib = np.array([b.liabilities_ib for b in banks], dtype=np.float64)
+    np.add.at(liabilities_ib, u, dw)
+    np.add.at(assets_ib, v, dw)
+    network.set_index_link_weights(banks, u, v, weights)
+    a_tot = assets_e + assets_ib + assets_com
+    network.init_system_assets = sum(a_tot.tolist(), network.init_system_assets)
+    liabilities_e = a_tot - liabilities_ib - a_tot * kappa
+    for b, a_e, a_ib, a_com, l_ib, l_e in zip(
+        banks, assets_e.tolist(), assets_ib.tolist(), assets_com.tolist(),
+        liabilities_ib.tolist(), liabilities_e.tolist()
+    ):
+        b.assets_e, b.assets_ib, b.assets_com = a_e, a_ib, a_com
+        b.liabilities_ib, b.liabilities_e = l_ib, l_e
+
+
+def _dcc_assets(in_deg, out_deg, alpha, c):
+    """
+    Returns arrays (interbank assets per predecessor, external assets, common
+    assets) of the degree dependent balance sheets.
+    """
+    deg = in_deg + out_deg
+    a_tot = np.where(deg > 0, (deg + np.maximum(out_deg - in_deg, 0)) * 100 / 2, 100) # linear relation
+    a_ib = np.where(in_deg > 0, a_tot * alpha, 0)
+    a_ib_per_pre = np.divide(a_ib, in_deg, out=np.zeros(len(a_ib)), where=in_deg > 0)
+    a_not_ib = a_tot - a_ib # total non-interbank assets (external + common)
+    a_com = a_not_ib * c
+    return a_ib_per_pre, a_not_ib - a_com, a_com
+
+
+def _init_balance_sheets_dcc_csr(network, alpha, kappa, c):
+    """
+    Array version of init_balance_sheets_dcc for CSRNetwork.
+    """
+    alive = np.zeros(len(network.defaulted), dtype=bool)
+    alive[network.banks] = True
+    a_ib_per_pre, assets_e, assets_com = _dcc_assets(
+        network.in_degrees(), network.out_degrees(), alpha, c
+    )
+    network.field("assets_e")[alive] = assets_e[alive]
+    network.field("assets_com")[alive] = assets_com[alive]
+    _, v, _ = network.link_arrays()
+    network.set_link_weights(a_ib_per_pre[v])
+    a_tot = network.assets_tot()[alive]
+    network.init_system_assets = sum(a_tot.tolist(), network.init_system_assets)
+    l_ib = network.field("liabilities_ib")[alive]
+    network.field("liabilities_e")[alive] = a_tot - l_ib - a_tot * kappa
 
 
 def init_balance_sheets_icc(network, alpha, kappa):
+    """
+    Balance sheets for banks investing in common external assets: every bank
+    has total assets 100, a fraction alpha of them split equally among its
+    investments, and capital fraction kappa.
+    Computed on arrays over all investments, with floating point results
+    identical to updating investment by investment.
+    """
     a_tot = 100
     a_com = a_tot * alpha
     c = a_tot - a_com # cash
     k = a_tot * kappa
     l = a_tot - k
-    for b in network.banks:
-        deg = network.inv_deg_of(b)
-        if deg > 0:
-            w = a_com / deg
-            b.balance_sheet["assets_e"] = c
-            for a in network.invs_of(b):
-                network.add_or_update_investment(b, a, investment=w) # sets a_com in balance sheets
-        else:
-            w = 0
-            b.balance_sheet["assets_e"] = a_tot
-        b.balance_sheet["liabilities_e"] = l
-        network.init_system_assets += a_tot
+    banks, assets = list(network.banks), list(network.ext_assets)
+    b_idx, a_idx, w_curr = network.investment_arrays(banks, assets)
+    inv_deg = np.bincount(b_idx, minlength=len(banks))
+    w = np.divide(a_com, inv_deg, out=np.zeros(len(banks)), where=inv_deg > 0)
+    investments = w[b_idx]
+    # common assets are summed in the order of investment updates
+    assets_com = np.array([b.assets_com for b in banks], dtype=np.float64)
+    np.add.at(assets_com, b_idx, investments - w_curr)
+    network.set_index_investments(banks, assets, b_idx, a_idx, investments)
+    for b, deg, a_c in zip(banks, inv_deg.tolist(), assets_com.tolist()):
+        b.assets_e = c if deg > 0 else a_tot
+        b.assets_com = a_c
+        b.liabilities_e = l
+    network.init_system_assets = sum([a_tot] * len(banks), network.init_system_assets)
 
 
 def unlinked(n):
@@ -106,123 +162,122 @@ def circular(n, alpha=0, kappa=0, c=0):
     return net
 
 
-def erdos_renyi(n, p, alpha=0, kappa=0, c=0):
+def erdos_renyi(n, p, alpha=0, kappa=0, c=0, rng=None):
+    rand = random.random if rng is None else rng.random
     net = unlinked(n)
     for u, v in permutations(net.banks, 2):
-        if random.random() < p:
+        if rand() < p:
             net.add_or_update_link(u, v, update_balance_sheets=False)
     if alpha > 0 or kappa > 0:
         init_balance_sheets_dcc(net, alpha, kappa, c)
     return net
 
 
-def bipartite_erdos_renyi(n, m, mu_b, alpha=0, kappa=0):
+def bipartite_erdos_renyi(n, m, mu_b, alpha=0, kappa=0, rng=None):
     """
+    n banks investing in m assets with int(n * mu_b) investments, drawn
+    uniformly among all n * m (bank, asset) pairs.
     alpha is fraction of common external assets, kappa is capital fraction on total assets
     """
-    net = Network()
-    bd, b_ids = {}, np.arange(n)
-    ad, a_ids = {}, np.arange(m)
-    for i in b_ids:
-        b = Bank()
-        net.add_bank(b)
-        bd[int(i)] = b
-    for i in a_ids:
-        a = Asset()
-        net.add_ext_asset(a)
-        ad[int(i)] = a
-    # https://stackoverflow.com/questions/1208118/using-numpy-to-build-an-array-of-all-combinations-of-two-arrays
-    comb = np.array(np.meshgrid(b_ids, a_ids)).T.reshape((n*m, 2))
-    # https://stackoverflow.com/questions/14262654/numpy-get-random-set-of-rows-from-2d-array
     numb_of_invests = int(n * mu_b)
-    res = comb[np.random.choice(comb.shape[0], numb_of_invests, replace=False), :]
-    # np.random.shuffle(comb)
-    # res = comb[:n*mu_b]
-    for bid, aid in res:
-        net.add_or_update_investment(bd[bid], ad[aid], update_balance_sheets=False)
-    if alpha > 0 or kappa > 0:
-        init_balance_sheets_icc(net, alpha, kappa)
-    return net
+    if numb_of_invests > n * m:
+        raise ValueError(f"Can not place {numb_of_invests} investments of {n} banks in {m} assets!")
+    integers = np.random.randint if rng is None else rng.integers
+    keys = np.zeros(0, dtype=np.int64) # sorted b * m + a
+    while len(keys) < numb_of_invests:
+        new_keys = np.sort(integers(n * m, size=numb_of_invests - len(keys)).astype(np.int64))
+        keys = np.sort(np.concatenate((keys, new_keys)), kind="stable")
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    return _bipartite_network(n, m, *np.divmod(keys, m), alpha, kappa)
 
 
-def fast_bipartite_erdos_renyi(n, m, mu_b, alpha=0, kappa=0):
+def fast_bipartite_erdos_renyi(n, m, mu_b, alpha=0, kappa=0, rng=None):
     """
+    n banks investing in m assets, each (bank, asset) pair independently with
+    probability mu_b / m. The gaps between investments are geometric and drawn
+    in blocks.
+
     V. Batagelj and Ulrik Brandes, "Efficient generation of large random networks",
     Phys Rev E 71, (2005)
     """
-    net = Network()
-    assets_numbered, banks_numbered = {}, {}
-    for i in range(min(n, m)):
-        b = Bank()
-        a = Asset()
-        net.add_bank(b)
-        net.add_ext_asset(a)
-        banks_numbered[i] = b
-        assets_numbered[i] = a
-    for i in range(min(n, m), max(n, m)):
-        if n > m:
-            b = Bank()
-            net.add_bank(b)
-            banks_numbered[i] = b
-        else:
-            a = Asset()
-            net.add_ext_asset(a)
-            assets_numbered[i] = a
     p = mu_b / m
     if p <= 0:
-        init_balance_sheets_icc(net, alpha, kappa)
-        return net
-    u, v, logp = 0, -1, math.log(1.0 - p)
-    while u < n:
-        logr = math.log(1.0 - random.random())
-        v = v + 1 + int(logr / logp)
-        while u < n and m <= v:
-            v = v - m
-            u = u + 1
-        if u < n:
-            bu, av = banks_numbered[u], assets_numbered[v]
-            net.add_or_update_investment(bu, av, update_balance_sheets=False)
-    if alpha > 0 or kappa > 0:
+        return _bipartite_network(n, m, [], [], alpha, kappa, init=True)
+    pos = _geometric_positions(n * m, p, rng)
+    return _bipartite_network(n, m, *np.divmod(pos, m), alpha, kappa)
+
+
+def _bipartite_network(n, m, b, a, alpha, kappa, init=False):
+    """
+    Network of n banks and m assets with investments of banks b[i] in assets a[i].
+    """
+    net = Network()
+    banks, assets = [Bank() for _ in range(n)], [Asset() for _ in range(m)]
+    net.add_banks_from(banks)
+    for asset in assets:
+        net.add_ext_asset(asset)
+    net.add_index_investments(banks, assets, b, a)
+    if init or alpha > 0 or kappa > 0:
         init_balance_sheets_icc(net, alpha, kappa)
     return net
 
 
-def fast_erdos_renyi(n, p, alpha=0, kappa=0, c=0):
+def fast_erdos_renyi(n, p, alpha=0, kappa=0, c=0, csr=False, rng=None):
     """
     V. Batagelj and Ulrik Brandes, "Efficient generation of large random networks",
     Phys Rev E 71, (2005)
+
+    If csr is True, a CSRNetwork is returned.
     """
-    net = Network()
-    banks_numbered = {}
-    for i in range(n):
-        b = Bank()
-        net.add_bank(b)
-        banks_numbered[i] = b
     if p >= 1:
         raise ValueError("p must be smaller than 1! Generate complete graph instead.")
-    if p <= 0:
-        init_balance_sheets_dcc(net, alpha, kappa, c)
+    us, vs = _batagelj_brandes_links(n, p, rng)
+    if csr:
+        net = CSRNetwork.from_edges(n, us, vs)
+        if p <= 0 or alpha > 0 or kappa > 0:
+            init_balance_sheets_dcc(net, alpha, kappa, c)
         return net
-    u, v, logp = 0, -1, math.log(1.0 - p)
-    while u < n:
-        logr = math.log(1.0 - random.random())
-        v = v + 1 + int(logr / logp)
-        if u == v:
-            v += 1
-        while u < n <= v:
-            v = v - n
-            u = u + 1
-            if u == v:
-                v += 1
-        if u < n: # add edge (u, v)
-            bu, bv = banks_numbered[u], banks_numbered[v]
-            net.add_or_update_link(bu, bv, update_balance_sheets=False)
-    if alpha > 0 or kappa > 0:
+    net = Network()
+    banks_numbered = [Bank() for _ in range(n)]
+    net.add_banks_from(banks_numbered)
+    net.add_index_links(banks_numbered, us, vs)
+    if p <= 0 or alpha > 0 or kappa > 0:
         init_balance_sheets_dcc(net, alpha, kappa, c)
     return net
 
 
-def directed_barabasi_albert(n, m, d=0.5, io=0.05, alpha=0, kappa=0, c=0):
+def _batagelj_brandes_links(n, p, rng=None):
+    """
+    Links (u, v), u != v, of a directed G(n, p) as index arrays in lexicographic
+    order. The n (n - 1) possible links are numbered row by row (skipping the
+    diagonal) and the gaps between successive links are drawn as geometric
+    random variables in blocks.
+    """
+    if p <= 0 or n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    us, vs = np.divmod(_geometric_positions(n * (n - 1), p, rng), n - 1)
+    vs += vs >= us # skip self-loop
+    return us, vs
+
+
+def _geometric_positions(slots, p, rng=None):
+    """
+    Sorted positions in range(slots), each included independently with
+    probability p, drawn as cumulative geometric gaps in blocks.
+    """
+    geometric = np.random.geometric if rng is None else rng.geometric
+    expected = slots * p
+    block_size = int(expected + 4 * math.sqrt(expected)) + 16
+    blocks, last = [], -1
+    while last < slots:
+        pos = last + np.cumsum(geometric(p, size=block_size), dtype=np.int64)
+        blocks.append(pos)
+        last = int(pos[-1])
+    pos = np.concatenate(blocks)
+    return pos[:np.searchsorted(pos, slots)]
+
+
+def directed_barabasi_albert(n, m, d=0.5, io=0.05, alpha=0, kappa=0, c=0, csr=False, rng=None):
     """
     Scale-free graph with n nodes. During preferential attachment, new node is
     connected to m existing nodes. With probability d the added edge goes from
@@ -232,112 +287,211 @@ def directed_barabasi_albert(n, m, d=0.5, io=0.05, alpha=0, kappa=0, c=0):
 
     Average Degree: <k> = m
     Gamma Exponent in powerlaw: gamma = 3
+
+    If csr is True, a CSRNetwork is returned.
     """
     if m < 1 or m >= n:
         raise ValueError(f"For barabasi albert network m >= 1 and m < n not m = {m}, n = {n}")
-    net = complete(m + 1)
-    # store nodes their in-deg + out-deg number of times
-    node_selector = [b for b in net.banks for _ in range(net.in_deg_of(b) + net.out_deg_of(b))]
-    n_curr = m + 1
-    while n_curr < n:
-        b = Bank()
-        net.add_bank(b)
-        n_curr += 1
-        connect_to = random_subset(node_selector, m)
-        for ctb in connect_to:
-            r = random.random()
-            if r < io:
-                net.add_or_update_link(b, ctb)
-                net.add_or_update_link(ctb, b)
-                node_selector.extend([b, ctb] * 2)
-            elif r < d:
-                net.add_or_update_link(b, ctb)
-                node_selector.extend([b, ctb])
-            else:
-                net.add_or_update_link(ctb, b)
-                node_selector.extend([b, ctb])
+    integers = np.random.randint if rng is None else rng.integers
+    uniform = np.random.random if rng is None else rng.random
+    new_nodes = np.arange(m + 1, n)
+    # link directions of all new nodes, drawn up front
+    r = uniform((len(new_nodes), m))
+    both = r < io
+    out = ~both & (r < d)
+    # node_selector stores nodes their in-deg + out-deg number of times: the
+    # complete graph on m + 1 nodes, then each new link adds its endpoints
+    # once (twice if bidirectional). The layout only depends on the link
+    # directions, so the selector sizes and the positions of the targets
+    # can be computed beforehand.
+    reps = 1 + both
+    init_size = 2 * m * (m + 1)
+    pair_bounds = np.concatenate(([0], np.cumsum(reps.sum(axis=1))))
+    sizes = init_size + 2 * pair_bounds[:-1]
+    node_selector = np.empty(init_size + 2 * pair_bounds[-1], dtype=np.int64)
+    node_selector[:init_size] = np.repeat(np.arange(m + 1), 2 * m)
+    node_selector[init_size::2] = np.repeat(new_nodes, reps.sum(axis=1))
+    pair_slots = np.repeat(np.tile(np.arange(m), len(new_nodes)), reps.ravel())
+    # m distinct targets per new node, drawn in order from the current selector
+    connect_to = integers(0, sizes[:, None], size=(len(new_nodes), m))
+    for t in range(len(new_nodes)):
+        targets = node_selector[connect_to[t]]
+        if len(set(targets.tolist())) < m:
+            drawn = []
+            for x in targets.tolist():
+                while x in drawn:
+                    x = int(node_selector[integers(sizes[t])])
+                drawn.append(x)
+            targets = np.array(drawn, dtype=np.int64)
+        connect_to[t] = targets
+        start, end = init_size + 2 * pair_bounds[t] + 1, init_size + 2 * pair_bounds[t + 1] + 1
+        node_selector[start:end:2] = targets[pair_slots[pair_bounds[t]:pair_bounds[t + 1]]]
+    new = np.broadcast_to(new_nodes[:, None], connect_to.shape)
+    us, vs = np.nonzero(~np.eye(m + 1, dtype=bool)) # complete graph
+    srcs = (us, new[both | out], connect_to[~out])
+    dsts = (vs, connect_to[both | out], new[~out])
+    us, vs = np.concatenate(srcs), np.concatenate(dsts)
+    order = np.argsort(us * n + vs)
+    us, vs = us[order], vs[order]
+    if csr:
+        net = CSRNetwork.from_edges(n, us, vs)
+    else:
+        net = Network()
+        banks_numbered = [Bank() for _ in range(n)]
+        net.add_banks_from(banks_numbered)
+        net.add_index_links(banks_numbered, us, vs)
     if alpha > 0 or kappa > 0:
         init_balance_sheets_dcc(net, alpha, kappa, c)
     return net
 
 
-def chung_lu(n, z, gamma=3, alpha=0, kappa=0, c=0):
-    net = Network()
-    banks_numbered, bank_numbers = {}, np.arange(1, n + 1)
-    for i in range(1, n + 1):
-        b = Bank()
-        net.add_bank(b)
-        banks_numbered[i] = b
+def chung_lu(n, z, gamma=3, alpha=0, kappa=0, c=0, csr=False, rng=None):
+    """
+    Directed Chung-Lu type network with int(n * z) links. Both endpoints of a
+    link are drawn with probability proportional to i^(-1 / (gamma - 1)),
+    i = 1, ..., n, from an alias table. Self-loops and duplicate links are
+    discarded and redrawn until the network has int(n * z) links.
+
+    If csr is True, a CSRNetwork is returned.
+    """
+    number_of_links = int(n * z)
+    if number_of_links > n * (n - 1):
+        raise ValueError(f"Can not place {number_of_links} links between {n} banks!")
     p = 1 / (gamma - 1)
-    ws = bank_numbers ** (- p) # np.array([i ** (- p) for i in bank_numbers])
-    wsum = np.sum(ws)
-    probs = ws / wsum
-    links = np.random.choice(bank_numbers, size=int(2*n*z), p=probs).reshape(-1, 2)
-    for u, v in links:
-        bu, bv = banks_numbered[u], banks_numbered[v]
-        while net.is_suc(bu, bv) or u == v:
-            # print(".", end="")
-            v = (v % n) + 1
-            bv = banks_numbered[v]
-        net.add_or_update_link(bu, bv, update_balance_sheets=False)
-    # while net.number_of_links < z * n:
-    #     u, v = np.random.choice(bank_numbers, size=2, replace=False, p=probs)
-    #     bu, bv = banks_numbered[u], banks_numbered[v]
-    #     net.add_or_update_link(bu, bv, update_balance_sheets=False)
+    ws = np.arange(1, n + 1) ** (- p)
+    table = _alias_table(ws / np.sum(ws))
+    keys = np.zeros(0, dtype=np.int64) # sorted u * n + v of accepted links
+    while len(keys) < number_of_links:
+        missing = number_of_links - len(keys)
+        us = _alias_sample(table, missing, rng)
+        vs = _alias_sample(table, missing, rng)
+        new_keys = np.sort((us * n + vs)[us != vs])
+        # merging two sorted runs is linear with the stable sort, then drop duplicates
+        keys = np.sort(np.concatenate((keys, new_keys)), kind="stable")
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    us, vs = np.divmod(keys, n)
+    if csr:
+        net = CSRNetwork.from_edges(n, us, vs)
+        if alpha > 0 or kappa > 0:
+            init_balance_sheets_dcc(net, alpha, kappa, c)
+        return net
+    net = Network()
+    banks_numbered = [Bank() for _ in range(n)]
+    net.add_banks_from(banks_numbered)
+    net.add_index_links(banks_numbered, us, vs)
     if alpha > 0 or kappa > 0:
         init_balance_sheets_dcc(net, alpha, kappa, c)
     return net
 
 
-def fast_chung_lu(n, d, gamma=3, alpha=0, kappa=0, c=0):
+def _alias_table(probs):
+    """
+    Alias table (acceptance probabilities, aliases) of the discrete
+    distribution probs (Vose's method).
     """
+    n = len(probs)
+    scaled = (np.asarray(probs, dtype=float) * n).tolist()
+    accept, alias = [1.0] * n, list(range(n))
+    small = np.flatnonzero(np.array(scaled) < 1).tolist()
+    large = np.flatnonzero(np.array(scaled) >= 1).tolist()
+    while small and large:
+        s, l = small.pop(), large.pop()
+        accept[s], alias[s] = scaled[s], l
+        scaled[l] = (scaled[l] + scaled[s]) - 1
+        if scaled[l] < 1:
+            small.append(l)
+        else:
+            large.append(l)
+    return np.array(accept), np.array(alias, dtype=np.int64)
+
+
+def _alias_sample(table, size, rng=None):
+    """
+    Draws size indices from the alias table.
+    """
+    accept, alias = table
+    integers = np.random.randint if rng is None else rng.integers
+    uniform = np.random.random if rng is None else rng.random
+    i = integers(len(accept), size=size)
+    return np.where(uniform(size) < accept[i], i, alias[i]).astype(np.int64)
+
+
+def fast_chung_lu(n, d, gamma=3, alpha=0, kappa=0, c=0, csr=False, rng=None):
+    """
+    Directed Chung-Lu network with expected average degree d, where link
+    (u, v) exists independently with probability min(w_u w_v / sum(w), 1).
+    The decreasing weights w follow [2], links are drawn with the skipping
+    algorithm of [1] in expected O(n + m) time. All rows are walked at once,
+    each step advancing every row to its next candidate link.
+
+    If csr is True, a CSRNetwork is returned.
+
     [1] Miller, Joel C., and Aric Hagberg. Springer (2011)
     [2] Fasino, D., Tonetto, A., & Tudisco, F. arXiv:1910.11341 (2019)
     """
-    net = Network()
-    banks_numbered, bank_numbers = {}, range(n)
-    for i in range(n):
-        b = Bank()
-        net.add_bank(b)
-        banks_numbered[i] = b
     if gamma <= 2:
         raise ValueError(f"gamma must be > 2, not {gamma}!")
     if d <= 2:
         raise ValueError(f"d must be > 2, not {d}!")
-    # construct weight list [2]
-    m = math.sqrt((d * n) / 2)
-    p = 1 / (gamma - 1)
-    c = (1 - p) * d * (n ** p)
-    i0 = (c / m) ** (1 / p) - 1
-    ws = [c / ((i + i0) ** p) for i in range(n)] # decreasing order
-    wsum = sum(ws)
-    # create chung-lu graph [1]
-    for u in range(n):
-        v = 0
-        if v == u: # no self-loops
-            v += 1
-        p_cl = min(ws[u] * ws[v] / wsum, 1)
-        while v < n and p_cl > 0:
-            if p_cl != 1:
-                r1 = random.random()
-                logr, logp = math.log(r1), math.log(1 - p_cl)
-                v = v + int(logr / logp)
-            if v == u:
-                v += 1
-            if v < n:
-                r2 = random.random()
-                q_cl = min(ws[u] * ws[v] / wsum, 1)
-                if r2 < q_cl / p_cl: # add edge (u, v)
-                    bu, bv = banks_numbered[u], banks_numbered[v]
-                    net.add_or_update_link(bu, bv, update_balance_sheets=False)
-                p_cl = q_cl
-                v += 1
+    us, vs = _chung_lu_links(_chung_lu_weights(n, d, gamma), rng)
+    if csr:
+        net = CSRNetwork.from_edges(n, us, vs)
+        if alpha > 0 or kappa > 0:
+            init_balance_sheets_dcc(net, alpha, kappa, c)
+        return net
+    net = Network()
+    banks_numbered = [Bank() for _ in range(n)]
+    net.add_banks_from(banks_numbered)
+    net.add_index_links(banks_numbered, us, vs)
     if alpha > 0 or kappa > 0:
-        # homo_cap = seed_homogenous_balance_sheets(net, alpha, kappa)
         init_balance_sheets_dcc(net, alpha, kappa, c)
     return net
 
 
+def _chung_lu_weights(n, d, gamma):
+    """
+    Decreasing weights of n banks with average degree d and power law
+    exponent gamma [2].
+    """
+    m = math.sqrt((d * n) / 2)
+    p = 1 / (gamma - 1)
+    c_w = (1 - p) * d * (n ** p)
+    i0 = (c_w / m) ** (1 / p) - 1
+    return c_w / ((np.arange(n) + i0) ** p)
+
+
+def _chung_lu_links(ws, rng=None):
+    """
+    Links (u, v), u != v, of the Chung-Lu network with decreasing weights ws
+    as index arrays in lexicographic order [1].
+    """
+    n, wsum = len(ws), np.sum(ws)
+    uniform = np.random.random if rng is None else rng.random
+    us, vs = [], []
+    rows = np.arange(n)
+    v = np.zeros(n, dtype=np.int64)
+    p = np.minimum(ws * ws[0] / wsum, 1) # probability at current position, upper bound for the rest
+    while len(rows) > 0:
+        # skip to next candidate, geometric with parameter p
+        r = 1 - uniform(len(rows))
+        with np.errstate(divide="ignore"):
+            skip = np.where(p < 1, np.floor(np.log(r) / np.log1p(-p)), 0)
+        v += np.minimum(skip, n).astype(np.int64)
+        keep = v < n
+        rows, v, p = rows[keep], v[keep], p[keep]
+        # accept candidate with probability q / p, q <= p as weights decrease
+        q = np.minimum(ws[rows] * ws[v] / wsum, 1)
+        accept = (uniform(len(rows)) * p < q) & (rows != v)
+        us.append(rows[accept])
+        vs.append(v[accept])
+        v += 1
+        keep = (v < n) & (q > 0)
+        rows, v, p = rows[keep], v[keep], q[keep]
+    keys = np.sort(np.concatenate(us + [np.zeros(0, dtype=np.int64)]) * n
+                   + np.concatenate(vs + [np.zeros(0, dtype=np.int64)]))
+    return np.divmod(keys, n)
+
+
 def from_unique_id_link_list(n, links, alpha=0, kappa=0, c=0):
     """
     Create network from list of links with unique bank ids and no gaps in ids.
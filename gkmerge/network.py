@@ -1,11 +1,17 @@
 import logging
-from collections import deque, Counter
+import bisect
+import heapq
+import math
+from collections import Counter
+import numpy as np
 from randomdict import RandomDict
 # from itertools import islice
 from typing import OrderedDict
-from gkmerge.bank import Bank
-from gkmerge.asset import Asset
-from gkmerge.util import sample_unique_pair, sample_except, random_pairs
+from gkmerge.bank import Bank, BALANCE_SHEET_FIELDS
+from gkmerge.asset import Asset, exp_devaluation
+from gkmerge.csr_network import CSRNetwork
+from gkmerge.cascade import icc_cascade
+from gkmerge.util import random_key, sample_unique_pair, sample_except, random_pairs
 
 logger = logging.getLogger(__name__)
 
@@ -35,9 +41,193 @@ def print_infos_icc(net):
     print("\n")
 
 
+class _LazyFireSales():
+    """
+    Common asset devaluation of the simultaneous cascade applied on demand.
+    In step i every solvent bank's remaining common asset is devaluated by
+    (1 - deprecation_factor) ** (number of banks defaulted in step i). Banks
+    remember up to which step their balance sheet is devaluated, and a heap
+    keyed by the number of defaults after which a bank could turn insolvent
+    tells which untouched banks have to be checked.
+    If merge_steps is True, pending steps are applied at once with their total
+    number of defaults as multiplicity, which the sequential cascade uses with
+    one step per default.
+    """
+    def __init__(self, banks, deprecation_factor, merge_steps=False):
+        self.factor = 1 - deprecation_factor
+        self.merge_steps = merge_steps
+        self.step_defaults = [] # number of banks defaulted in each step
+        self.defaults_until = [0] # number of banks defaulted before each step
+        self.total_defaults = 0
+        self.epoch = {} # stores {bank: steps applied}, 0 if missing
+        self.version = {}
+        self.heap = []
+        for b in banks:
+            self._push(b, heapify=False)
+        heapq.heapify(self.heap)
+
+    def add_step(self, newly_defaulted):
+        self.step_defaults.append(newly_defaulted)
+        self.total_defaults += newly_defaulted
+        self.defaults_until.append(self.total_defaults)
+
+    def apply(self, bank):
+        """
+        Devaluate common asset of bank up to the current step, if bank is
+        still solvent. Same arithmetic as Bank.asset_com_shock.
+        """
+        steps = len(self.step_defaults)
+        epoch = self.epoch.get(bank, 0)
+        if epoch == steps:
+            return
+        self.epoch[bank] = steps
+        if bank.defaulted or not bank.is_solvent():
+            return
+        if self.merge_steps:
+            multiplicities = (self.total_defaults - self.defaults_until[epoch],)
+        else:
+            multiplicities = self.step_defaults[epoch:]
+        for multiplicity in multiplicities:
+            curr_a_com = bank.assets_com - bank.shock_e
+            new_a_com = curr_a_com * self.factor ** multiplicity
+            bank.shock_e += curr_a_com - new_a_com
+
+    def update(self, bank):
+        """
+        Apply pending devaluations to bank and reschedule it. Returns True if
+        bank is insolvent afterwards.
+        """
+        self.apply(bank)
+        if bank.defaulted or not bank.is_solvent():
+            self.version.pop(bank, None)
+            return not bank.defaulted
+        self._push(bank)
+        return False
+
+    def pop_candidates(self):
+        """
+        Yields banks that could have turned insolvent by now.
+        """
+        while self.heap and self.heap[0][0] <= self.total_defaults:
+            _, _, version, bank = heapq.heappop(self.heap)
+            if self.version.get(bank) == version:
+                yield bank
+
+    def _push(self, bank, heapify=True):
+        if bank.defaulted:
+            return
+        capital = bank.capital()
+        curr_a_com = bank.assets_com - bank.shock_e
+        if capital <= 0 or curr_a_com <= 0 or curr_a_com < capital:
+            self.version.pop(bank, None)
+            return
+        if self.factor <= 0 or curr_a_com == capital:
+            horizon = 1
+        else:
+            # capital - curr_a_com * (1 - factor ** k) <= 0 for k >= horizon
+            horizon = math.log(1 - capital / curr_a_com) / math.log(self.factor)
+            horizon = max(1, int(horizon) - 1) # conservative, checked on pop
+        version = self.version.get(bank, 0) + 1
+        self.version[bank] = version
+        entry = (self.total_defaults + horizon, bank.id_, version, bank)
+        if heapify:
+            heapq.heappush(self.heap, entry)
+        else:
+            self.heap.append(entry)
+
+
+class _DegreeIndex():
+    """
+    Banks bucketed by degree, kept up to date by the network. Buckets are
+    dicts used as ordered sets, and the degrees of non-empty buckets are kept
+    in a sorted list, so queries only visit the buckets they need.
+    """
+    def __init__(self, degrees):
+        self.degree = {} # stores {bank: degree}
+        self.buckets = {} # stores {degree: {bank: None, ...}, ...}
+        self.sorted_degrees = [] # degrees of non-empty buckets, ascending
+        for bank, degree in degrees:
+            self.add(bank, degree)
+
+    def add(self, bank, degree):
+        self.degree[bank] = degree
+        bucket = self.buckets.get(degree)
+        if bucket is None:
+            bucket = self.buckets[degree] = {}
+            bisect.insort(self.sorted_degrees, degree)
+        bucket[bank] = None
+
+    def remove(self, bank):
+        degree = self.degree.pop(bank)
+        bucket = self.buckets[degree]
+        del bucket[bank]
+        if not bucket:
+            del self.buckets[degree]
+            del self.sorted_degrees[bisect.bisect_left(self.sorted_degrees, degree)]
+
+    def shift(self, bank, delta):
+        degree = self.degree[bank]
+        self.remove(bank)
+        self.add(bank, degree + delta)
+
+    def descending(self):
+        """
+        Yields non-empty buckets in order of descending degree.
+        """
+        for degree in reversed(self.sorted_degrees):
+            yield self.buckets[degree]
+
+    def kth_highest(self, k, seq):
+        """
+        k-th bank in order of descending degree, ties ranked by descending
+        seq[bank] (as sorted(banks, key=degree)[-k] for banks in seq order).
+        """
+        if k < 1 or k > len(self.degree):
+            raise IndexError("list index out of range")
+        for bucket in self.descending():
+            if k <= len(bucket):
+                return heapq.nlargest(k, bucket, key=seq.__getitem__)[-1]
+            k -= len(bucket)
+
+    def highest(self, seq):
+        """
+        Bank of highest degree, the one with smallest seq[bank] on ties.
+        """
+        for bucket in self.descending():
+            return min(bucket, key=seq.__getitem__)
+        raise ValueError("Network has no banks!")
+
+
+def _update_grouped(adjacency, keys, src, values, dst, weights):
+    """
+    Sets adjacency[keys[src[i]]][values[dst[i]]] = weights[i], with one dict
+    update per key.
+    """
+    order = np.argsort(src, kind="stable")
+    bounds = np.searchsorted(src[order], np.arange(len(keys) + 1)).tolist()
+    value_array = np.empty(len(values), dtype=object)
+    value_array[:] = list(values)
+    dst_values = value_array[dst[order]].tolist()
+    ws = weights[order].tolist()
+    for i, k in enumerate(keys):
+        start, end = bounds[i], bounds[i + 1]
+        if start < end:
+            try:
+                adjacency[k].update(zip(dst_values[start:end], ws[start:end]))
+            except KeyError:
+                raise ValueError(f"{type(k).__name__} with id {k.id_} is not in network!")
+
+
 class Network():
     def __init__(self, input=None): # banks is dict-like and holds bank: bank
         self.banks = RandomDict()
+        self._bank_seq = {} # stores {bank: insertion number}, ties of get_largest
+        self._next_seq = 0
+        self._largest = None # lazy heap of (-merge_state, insertion number, bank)
+        self._version = 0 # counts changes of banks, assets, links and investments
+        self._csr = None # (version, banks, CSRNetwork copy), see _csr_view
+        self._in_degs = None # lazy _DegreeIndex of in-degrees
+        self._out_degs = None # lazy _DegreeIndex of out-degrees
         self.number_of_links = 0
         self._pres = {} # stores {bank: {pre_of_bank: weight, ...}, ...}
         self._sucs = {} # stores {bank: {suc_of_bank: weight, ...}, ...}
@@ -46,6 +236,9 @@ class Network():
         self.number_of_investments = 0
         self._bank_invest = {} # stores {bank: {ext_a: investment}, ...}, ...}
         self._asset_invest = {} # stores {ext_a: {bank: investment}, ...}, ...}
+        self._invested = {} # stores {ext_a: total investment}
+        self._liquidated = {} # stores {ext_a: total investment of defaulted banks}
+        self._liquidated_at = Bank.default_changes # see _liquidated_totals
 
         self.simultaneous_cascade_steps = None
         self.merge_round = 0
@@ -92,11 +285,18 @@ class Network():
         of added bank if neccessary and make sure links are correct with the
         pres and sucs.
         """
+        self._version += 1
         if not isinstance(bank, Bank):
             raise TypeError(f"Can only add Banks, not type {type(bank)}")
         if bank in self.banks:
             raise ValueError(f"Bank with id {bank.id_} is already in network!")
         self.banks[bank] = bank
+        self._bank_seq[bank] = self._next_seq
+        self._next_seq += 1
+        self._push_largest(bank)
+        if self._in_degs is not None:
+            self._in_degs.add(bank, 0)
+            self._out_degs.add(bank, 0)
         self._sucs[bank] = {}
         self._pres[bank] = {}
         self._bank_invest[bank] = {}
@@ -106,10 +306,19 @@ class Network():
             self.add_bank(b)
 
     def remove_bank(self, bank, update_balance_sheets=True):
+        self._version += 1
         try:
             del self.banks[bank]
         except KeyError:
             raise ValueError(f"Bank with id {bank.id_} is not in network!")
+        self.number_of_links -= len(self._pres[bank]) + len(self._sucs[bank])
+        if self._in_degs is not None:
+            for pre in self._pres[bank]:
+                self._out_degs.shift(pre, -1)
+            for suc in self._sucs[bank]:
+                self._in_degs.shift(suc, -1)
+            self._in_degs.remove(bank)
+            self._out_degs.remove(bank)
         for pre, w in self.pres_of(bank, weight=True):
             if update_balance_sheets:
                 pre.balance_sheet["liabilities_ib"] -= w
@@ -120,32 +329,38 @@ class Network():
                 suc.balance_sheet["assets_ib"] -= w
             del self._pres[suc][bank]
         del self._sucs[bank]
-        for a in self.invs_of(bank):
-            del self._asset_invest[a][bank]
+        self._remove_investments(bank)
         del self._bank_invest[bank]
+        del self._bank_seq[bank]
     
     def remove_banks_from(self, banks):
         for b in banks:
             self.remove_bank(b)
     
     def add_ext_asset(self, asset):
+        self._version += 1
         if not isinstance(asset, Asset):
             raise TypeError(f"Can only add Assets, not type {type(asset)}")
         if asset in self.ext_assets:
             raise ValueError(f"Asset with id {asset.id_} is already in network!")
         self.ext_assets[asset] = asset # ???
         self._asset_invest[asset] = {}
+        self._invested[asset] = 0
+        self._liquidated[asset] = 0
     
     def remove_ext_asset(self, asset, update_balance_sheets=True):
+        self._version += 1
         try:
             del self.ext_assets[asset]
         except KeyError:
             raise ValueError(f"Asset with id {asset.id_} is not in network!")
-        for b, inv in self._asset_invest[asset]:
+        for b, inv in self._asset_invest[asset].items():
             if update_balance_sheets:
                 b.balance_sheet["assets_com"] -= inv
             del self._bank_invest[b][asset]
         del self._asset_invest[asset]
+        del self._invested[asset]
+        del self._liquidated[asset]
 
     def add_or_update_link(self, u, v, weight=0, update_balance_sheets=True):
         """
@@ -153,6 +368,7 @@ class Network():
         If update_balance_sheets is True, interbank positions in balance sheets
         will also be updated.
         """
+        self._version += 1
         if u == v:
             raise ValueError("Selfloops are not supported!")
         try:
@@ -166,14 +382,70 @@ class Network():
                 v.balance_sheet["assets_ib"] += weight - curr_weight
             if not v in u_sucs: # link already in network
                 self.number_of_links += 1
+                if self._in_degs is not None:
+                    self._out_degs.shift(u, 1)
+                    self._in_degs.shift(v, 1)
             u_sucs[v] = weight
             v_pres[u] = weight
         except KeyError:
             raise ValueError(f"Bank(s) from link ({u.id_}, {v.id_}) not in network!")
     
     add_link = add_or_update_link
+
+    def pre_link_arrays(self, banks):
+        """
+        Returns link arrays (u, v, weight), u and v being indices into the list
+        banks of all banks in the network. Links are ordered by v and then by
+        the predecessors of v (see pres_of).
+        """
+        index = {b: i for i, b in enumerate(banks)}
+        u, w, in_deg = [], [], []
+        for b in banks:
+            pres = self._pres[b]
+            u.extend(map(index.__getitem__, pres))
+            w.extend(pres.values())
+            in_deg.append(len(pres))
+        v = np.repeat(np.arange(len(banks), dtype=np.int64), in_deg)
+        return np.array(u, dtype=np.int64), v, np.array(w, dtype=np.float64)
+
+    def add_index_links(self, banks, u, v, weight=0):
+        """
+        Adds links (banks[u[i]], banks[v[i]]) given as index arrays into the
+        sequence banks of banks in the network, without updating balance
+        sheets. The links must not be in the network yet and should be sorted
+        by u to keep the successor order of add_or_update_link.
+        """
+        self._version += 1
+        u, v = np.asarray(u, dtype=np.int64), np.asarray(v, dtype=np.int64)
+        if np.any(u == v):
+            raise ValueError("Selfloops are not supported!")
+        self._update_index_links(banks, u, v, np.full(len(u), weight))
+        self.number_of_links += len(u)
+        if self._in_degs is not None:
+            for degs, idx in ((self._out_degs, u), (self._in_degs, v)):
+                counts = np.bincount(idx, minlength=len(banks))
+                for i in np.flatnonzero(counts).tolist():
+                    degs.shift(banks[i], int(counts[i]))
+
+    def set_index_link_weights(self, banks, u, v, weights):
+        """
+        Sets the weights of links (banks[u[i]], banks[v[i]]) already in the
+        network, without updating balance sheets.
+        """
+        self._version += 1
+        u, v = np.asarray(u, dtype=np.int64), np.asarray(v, dtype=np.int64)
+        self._update_index_links(banks, u, v, np.asarray(weights, dtype=np.float64))
+
+    def _update_index_links(self, banks, u, v, weights):
+        """
+        Writes the weights of links given as index arrays into the successor
+        and predecessor dicts.
+        """
+        _update_grouped(self._sucs, banks, u, banks, v, weights)
+        _update_grouped(self._pres, banks, v, banks, u, weights)
     
     def remove_link(self, u, v, update_balance_sheets=True):
+        self._version += 1
         try:
             if update_balance_sheets:
                 weight = self._sucs[u][v]
@@ -181,6 +453,10 @@ class Network():
                 v.balance_sheet["assets_ib"] -= weight
             del self._sucs[u][v]
             del self._pres[v][u]
+            self.number_of_links -= 1
+            if self._in_degs is not None:
+                self._out_degs.shift(u, -1)
+                self._in_degs.shift(v, -1)
         except KeyError:
             raise ValueError(f"Link ({u.id_}, {v.id_}) is not in network!")
     
@@ -191,21 +467,113 @@ class Network():
             raise ValueError(f"Link ({u.id_}, {v.id_}) is not in network!")
     
     def add_or_update_investment(self, bank, asset, investment=0, update_balance_sheets=True):
+        self._version += 1
         try:
             b_inv = self._bank_invest[bank]
             a_inv = self._asset_invest[asset]
+            curr_inv = b_inv.get(asset, 0)
             if update_balance_sheets:
-                curr_inv = 0
-                if asset in self._bank_invest[bank]:
-                    curr_inv = self._bank_invest[bank][asset]
                 bank.balance_sheet["assets_com"] += investment - curr_inv
             if not asset in b_inv:
                 self.number_of_investments += 1
             b_inv[asset] = investment
             a_inv[bank] = investment
+            self._invested[asset] += investment - curr_inv
+            if bank.defaulted:
+                self._liquidated[asset] += investment - curr_inv
         except KeyError:
             raise ValueError(f"Asset with id {asset.id_} or bank with id {bank.id_} not in network!")
 
+    def investment_arrays(self, banks, assets):
+        """
+        Returns investment arrays (b, a, investment), b and a being indices
+        into the lists banks and assets of all banks and assets in the network.
+        Investments are ordered by b and then by the investments of b (see
+        invs_of).
+        """
+        index = {a: i for i, a in enumerate(assets)}
+        a_idx, w, inv_deg = [], [], []
+        for b in banks:
+            invs = self._bank_invest[b]
+            a_idx.extend(map(index.__getitem__, invs))
+            w.extend(invs.values())
+            inv_deg.append(len(invs))
+        b_idx = np.repeat(np.arange(len(banks), dtype=np.int64), inv_deg)
+        return b_idx, np.array(a_idx, dtype=np.int64), np.array(w, dtype=np.float64)
+
+    def holding_arrays(self, banks, assets):
+        """
+        Returns investment arrays (a, b, investment) as in investment_arrays,
+        but ordered by a and then by the investors of a.
+        """
+        index = {b: i for i, b in enumerate(banks)}
+        b_idx, w, asset_deg = [], [], []
+        for a in assets:
+            invs = self._asset_invest[a]
+            b_idx.extend(map(index.__getitem__, invs))
+            w.extend(invs.values())
+            asset_deg.append(len(invs))
+        a_idx = np.repeat(np.arange(len(assets), dtype=np.int64), asset_deg)
+        return a_idx, np.array(b_idx, dtype=np.int64), np.array(w, dtype=np.float64)
+
+    def add_index_investments(self, banks, assets, b, a, investment=0):
+        """
+        Adds investments of banks[b[i]] in assets[a[i]] given as index arrays,
+        without updating balance sheets. The investments must not be in the
+        network yet.
+        """
+        b, a = np.asarray(b, dtype=np.int64), np.asarray(a, dtype=np.int64)
+        self.set_index_investments(banks, assets, b, a, np.full(len(b), investment))
+        self.number_of_investments += len(b)
+
+    def set_index_investments(self, banks, assets, b, a, investments):
+        """
+        Sets investments of banks[b[i]] in assets[a[i]] already in the network,
+        without updating balance sheets.
+        """
+        self._version += 1
+        b, a = np.asarray(b, dtype=np.int64), np.asarray(a, dtype=np.int64)
+        investments = np.asarray(investments, dtype=np.float64)
+        _update_grouped(self._bank_invest, banks, b, assets, a, investments)
+        _update_grouped(self._asset_invest, assets, a, banks, b, investments)
+        for i in np.unique(a).tolist():
+            self._count_investments(assets[i])
+
+    def _count_investments(self, asset):
+        """
+        Recount running totals of invested and liquidated investments of asset.
+        """
+        invested, liquidated = 0, 0
+        for b, w in self._asset_invest[asset].items():
+            if b.defaulted:
+                liquidated += w
+            invested += w
+        self._invested[asset] = invested
+        self._liquidated[asset] = liquidated
+
+    def _liquidate(self, bank):
+        """
+        Add investments of bank to the liquidated totals, bank having just
+        defaulted with the totals valid before.
+        """
+        liquidated = self._liquidated
+        for a, w in self._bank_invest[bank].items():
+            liquidated[a] += w
+        self._liquidated_at = Bank.default_changes
+
+    def _liquidated_totals(self):
+        """
+        Returns the liquidated totals {ext_a: total investment of defaulted
+        banks}. They are kept up to date by icc_cascade, and recounted on
+        demand if any bank defaulted or recovered otherwise (a cascade or
+        setting Bank.defaulted), which Bank.default_changes counts.
+        """
+        if self._liquidated_at != Bank.default_changes:
+            for a, invs in self._asset_invest.items():
+                self._liquidated[a] = sum(w for b, w in invs.items() if b.defaulted)
+            self._liquidated_at = Bank.default_changes
+        return self._liquidated
+
     def get_inv_weight(self, bank, asset):
         try:
             return self._bank_invest[bank][asset]
@@ -279,36 +647,63 @@ class Network():
             raise ValueError(f"Asset with id {asset.id_} is not in network!")
     
     def liquidated_fraction(self, asset):
+        """
+        Fraction of the investments in asset held by defaulted banks, from
+        running totals, see _liquidated_totals.
+        """
         try:
-            tc, lc = 0, 0
-            for b, w in self._asset_invest[asset].items():
-                if b.defaulted:
-                    lc += w
-                tc += w
-            return lc / tc
+            return self._liquidated_totals()[asset] / self._invested[asset]
         except KeyError:
             raise ValueError(f"Asset with id {asset.id_} is not in network!")
 
     def get_largest(self):
-        # if all banks are equal size returns the first in iterator
-        return max(self.banks, key=lambda b: b.merge_state)
+        """
+        Bank with the largest merge_state, the first one added to the network
+        on ties. Answered from a heap that is built on the first call and
+        updated by add_bank and merges, so merge_state must only change
+        through merges. Removed or outdated entries are dropped lazily.
+        """
+        heap = self._largest
+        if heap is None:
+            heap = self._largest = [(-b.merge_state, self._bank_seq[b], b) for b in self.banks]
+            heapq.heapify(heap)
+        while heap:
+            merge_state, seq, b = heap[0]
+            if self._bank_seq.get(b) == seq and b.merge_state == -merge_state:
+                return b
+            heapq.heappop(heap)
+        raise ValueError("Network has no banks!")
+
+    def _push_largest(self, bank):
+        if self._largest is not None:
+            heapq.heappush(self._largest, (-bank.merge_state, self._bank_seq[bank], bank))
     
+    def _degree_indexes(self):
+        """
+        Returns the in- and out-degree indexes, built on first use and then
+        kept up to date by link and bank updates and merges.
+        """
+        if self._in_degs is None:
+            self._in_degs = _DegreeIndex((b, len(self._pres[b])) for b in self.banks)
+            self._out_degs = _DegreeIndex((b, len(self._sucs[b])) for b in self.banks)
+        return self._in_degs, self._out_degs
+
     def get_highest_in_deg(self):
-        return max(self.banks, key=lambda b: self.in_deg_of(b))
+        return self._degree_indexes()[0].highest(self._bank_seq)
 
     def get_highest_out_deg(self):
-        return max(self.banks, key=lambda b: self.out_deg_of(b))
+        return self._degree_indexes()[1].highest(self._bank_seq)
     
     def get_kth_highest_in_deg(self, k):
-        return sorted(list(self.banks), key=lambda b: self.in_deg_of(b))[-k]
+        return self._degree_indexes()[0].kth_highest(k, self._bank_seq)
     
     def get_kth_highest_out_deg(self, k):
-        return sorted(list(self.banks), key=lambda b: self.out_deg_of(b))[-k]
+        return self._degree_indexes()[1].kth_highest(k, self._bank_seq)
 
-    def shock_random(self):
+    def shock_random(self, rng=None):
         # https://stackoverflow.com/questions/32802869/selecting-a-random-value-from-dictionary-in-constant-time-in-python-3
         # b = next(islice(self.banks.keys(), np.random.randint(0, len(self.banks)), None))
-        b = self.banks.random_key()
+        b = random_key(self.banks, rng)
         b.aggregate_shock()
         return b
 
@@ -327,8 +722,13 @@ class Network():
         b.aggregate_shock()
         return b
 
-    def shock_random_asset(self, phi_new):
-        a = self.ext_assets.random_key()
+    def shock_kth_in_deg(self, k):
+        b = self.get_kth_highest_in_deg(k)
+        b.aggregate_shock()
+        return b
+
+    def shock_random_asset(self, phi_new, rng=None):
+        a = random_key(self.ext_assets, rng)
         # print(f"Asset {a.id_} initially shocked!")
         phi_curr = a.phi
         a.phi = phi_new
@@ -337,7 +737,7 @@ class Network():
                 continue
             new_shock = w * phi_curr - w * phi_new
             # print(f"bank {b.id_} got new shock {new_shock} due to initial asset shock")
-            b.balance_sheet["shock_e"] += new_shock
+            b.shock_e += new_shock
         return a
 
     def cascade(
@@ -349,11 +749,23 @@ class Network():
         Update mode specifies order of bank updates:
             - 'simultaneous':   Update in timesteps. In step i + 1 only successors of
                                 banks defaulted in step i can default
-            - 'sequential':     Update order arbitrary. Much faster.
+            - 'sequential':     Update order arbitrary. Much faster, as only banks
+                                touched by the cascade are visited
+            - 'vectorized':     Same as 'simultaneous', computed with numpy
+                                arrays on a CSRNetwork copy of the network.
+            - 'frontier':       Same as 'simultaneous', but only banks touched by
+                                the cascade are visited. Requires all banks but
+                                init_shock_bank to be solvent initially.
         """
         if mode ==  "simultaneous":
             self.simultaneous_cascade_steps = 0
             self._simultaneous_cascade(recovery_rate, deprecation_factor, record_profiles)
+        elif mode == "vectorized":
+            self._vectorized_cascade(recovery_rate, deprecation_factor, record_profiles)
+        elif mode == "frontier":
+            self._frontier_cascade(
+                init_shock_bank, recovery_rate, deprecation_factor, record_profiles
+            )
         elif mode == "sequential":
             self._sequential_cascade(
                 init_shock_bank, recovery_rate, deprecation_factor, record_profiles
@@ -361,6 +773,32 @@ class Network():
         else:
             raise ValueError(f"Update mode '{mode}' is unknown!")
         
+    def batched_cascade(
+        self, shock_banks="random", runs=1, recovery_rate=0, deprecation_factor=0, rng=None
+    ):
+        """
+        Simultaneous cascades upon the initial shock of several banks, computed
+        at once on a CSRNetwork copy. shock_banks is either 'random' (runs banks
+        drawn with replacement from rng), 'max_in_deg' or a list of banks. The
+        state of the network is not modified.
+        Returns dict of arrays df, af and steps with one entry per run.
+        """
+        if isinstance(shock_banks, str):
+            if shock_banks == "random":
+                shock_banks = [random_key(self.banks, rng) for _ in range(runs)]
+            elif shock_banks == "max_in_deg":
+                shock_banks = [self.get_highest_in_deg()] * runs
+            else:
+                raise ValueError(f"Unknown shock mode '{shock_banks}'!")
+        index = {b: i for i, b in enumerate(self.banks)}
+        try:
+            shock_banks = [index[b] for b in shock_banks]
+        except KeyError as e:
+            raise ValueError(f"Bank with id {e.args[0].id_} is not in network!")
+        return self._csr_view()[1].batched_cascade(
+            shock_banks, recovery_rate=recovery_rate, deprecation_factor=deprecation_factor
+        )
+
     def _simultaneous_cascade(self, recovery_rate, deprecation_factor, record_profiles):
         something_changed = True
         steps = 0
@@ -389,11 +827,7 @@ class Network():
                             deprecation_factor, multiplicity=newly_defaulted, temp=True
                         )
                     # apply changes
-                    if b.temp_defaulted is not None:
-                        b.defaulted = b.temp_defaulted
-                    if b.temp_balance_sheet is not None:
-                        b.balance_sheet = b.temp_balance_sheet
-                    b.reset_temps()
+                    b.commit_temps()
                 steps += 1
                 if record_profiles:
                     curr_system_assets = self.init_system_assets - self.defaulted_system_assets
@@ -401,43 +835,173 @@ class Network():
                     self.df_over_time.append(self.defaulted_fraction())
         self.simultaneous_cascade_steps = steps
 
+    def _frontier_cascade(self, init_shock_bank, recovery_rate, deprecation_factor, record_profiles):
+        """
+        Simultaneous cascade driven by the frontier of banks turning insolvent.
+        A step updates the frontier banks (in the order of self.banks, as the
+        simultaneous cascade does) and commits the temp states
+        of their shocked successors only. Common asset devaluation is applied
+        lazily, see _LazyFireSales, which costs one pass over all banks at the
+        beginning and at the end of the cascade.
+        """
+        steps = 0
+        fire_sales = None
+        if deprecation_factor > 0:
+            fire_sales = _LazyFireSales(self.banks, deprecation_factor)
+        if record_profiles:
+            self.system_assets_over_time.append(self.init_system_assets)
+            number_defaulted = sum(1 for b in self.banks if b.defaulted)
+        frontier = [init_shock_bank]
+        while frontier:
+            frontier.sort(key=self._bank_seq.__getitem__)
+            newly_defaulted, touched = [], {}
+            if fire_sales is not None:
+                for b in frontier:
+                    for suc in self.sucs_of(b):
+                        fire_sales.apply(suc)
+            for b in frontier:
+                sucs = self.sucs_of(b, weight=True)
+                if b.update_state(sucs, recovery_rate, mode="simultaneous"):
+                    newly_defaulted.append(b)
+                    self.defaulted_system_assets += b.assets_tot()
+                    touched[b] = True
+                    touched.update((suc, True) for suc, _ in sucs)
+            if not newly_defaulted:
+                break
+            for b in touched:
+                b.commit_temps()
+            steps += 1
+            frontier = []
+            if fire_sales is None:
+                frontier = [b for b in touched if not b.defaulted and not b.is_solvent()]
+            else:
+                fire_sales.add_step(len(newly_defaulted))
+                for b in touched:
+                    if fire_sales.update(b):
+                        frontier.append(b)
+                frontier.extend(b for b in fire_sales.pop_candidates() if fire_sales.update(b))
+            if record_profiles:
+                number_defaulted += len(newly_defaulted)
+                curr_system_assets = self.init_system_assets - self.defaulted_system_assets
+                self.system_assets_over_time.append(curr_system_assets)
+                self.df_over_time.append(number_defaulted / self.number_of_banks)
+        if fire_sales is not None:
+            for b in self.banks:
+                fire_sales.apply(b)
+        self.simultaneous_cascade_steps = steps
+
+    def _vectorized_cascade(self, recovery_rate, deprecation_factor, record_profiles):
+        """
+        Simultaneous cascade on a CSRNetwork copy. Defaults and shocks are
+        written back to the banks whose state changed.
+        """
+        banks, csr = self._csr_view()
+        defaulted, shock, shock_e = csr.defaulted.copy(), csr.field("shock").copy(), csr.field("shock_e").copy()
+        csr.cascade(
+            mode="simultaneous", recovery_rate=recovery_rate,
+            deprecation_factor=deprecation_factor, record_profiles=record_profiles
+        )
+        changed = np.flatnonzero(
+            (csr.defaulted != defaulted) | (csr.field("shock") != shock) | (csr.field("shock_e") != shock_e)
+        )
+        for i in changed.tolist():
+            b = banks[i]
+            b.defaulted = bool(csr.defaulted[i])
+            b.shock = float(csr.field("shock")[i])
+            b.shock_e = float(csr.field("shock_e")[i])
+        self.defaulted_system_assets = csr.defaulted_system_assets
+        self.system_assets_over_time.extend(csr.system_assets_over_time)
+        self.df_over_time.extend(csr.df_over_time)
+        self.simultaneous_cascade_steps = csr.simultaneous_cascade_steps
+
+    def _csr_view(self):
+        """
+        Returns banks and a CSRNetwork copy with the current state. The links
+        of the copy are cached until banks or links change, the state of the
+        banks is copied on every call.
+        """
+        if self._csr is None or self._csr[0] != self._version:
+            banks = list(self.banks)
+            self._csr = (self._version, banks, CSRNetwork.from_network(self))
+            return banks, self._csr[2]
+        _, banks, csr = self._csr
+        csr.reset_cascade()
+        csr.load_state(self, banks)
+        return banks, csr
+
     def _sequential_cascade(self, init_shock_bank, recovery_rate, deprecation_factor, record_profiles):
         """
-        Default cascade with sequential update mode.
+        Default cascade with sequential update mode. Insolvent banks are popped
+        from a worklist and default one at a time, shocking their successors.
+        Only banks touched by the cascade are visited. With deprecation_factor
+        > 0 every default devaluates the remaining common asset of all solvent
+        banks by (1 - deprecation_factor), applied lazily by _LazyFireSales.
         """
+        fire_sales = None
         if deprecation_factor > 0:
-            raise NotImplementedError()
-        stack = deque()
-        on_stack = {b: False for b in self.banks}
-        # Init stack
-        stack.append(init_shock_bank)
-        on_stack[init_shock_bank] = True
-        while(stack):
+            fire_sales = _LazyFireSales(self.banks, deprecation_factor, merge_steps=True)
+        stack, queued = [init_shock_bank], {init_shock_bank}
+        while stack:
             b = stack.pop()
-            on_stack[b] = False
-            if b.update_state(self.sucs_of(b, weight=True), recovery_rate, mode="sequential"):
-                for suc in self.sucs_of(b):
-                    if not suc.defaulted and not on_stack[suc]:
-                        stack.append(suc)
-                        on_stack[suc] = True
+            queued.discard(b)
+            if b.defaulted:
+                continue
+            if fire_sales is None:
+                if b.is_solvent():
+                    continue
+            elif not fire_sales.update(b):
+                continue
+            sucs = self.sucs_of(b, weight=True)
+            if fire_sales is not None:
+                for suc, _ in sucs:
+                    fire_sales.apply(suc)
+            b._sequential_update(sucs, recovery_rate)
+            self.defaulted_system_assets += b.assets_tot()
+            for suc, _ in sucs:
+                if not suc.defaulted and suc not in queued:
+                    stack.append(suc)
+                    queued.add(suc)
+            if fire_sales is not None:
+                fire_sales.add_step(1)
+                for c in fire_sales.pop_candidates():
+                    if c not in queued:
+                        stack.append(c)
+                        queued.add(c)
+        if fire_sales is not None:
+            for b in self.banks:
+                fire_sales.apply(b)
     
     def reset_cascade(self):
         for b in self.banks:
             b.defaulted = False
             b.reset_temps()
             b.r_val = 0
-            b.balance_sheet["shock"] = 0
-            b.balance_sheet["shock_e"] = 0
+            b.shock = 0.0
+            b.shock_e = 0.0
         for a in self.ext_assets:
             a.phi = 1
+            self._liquidated[a] = 0
+        self._liquidated_at = Bank.default_changes
         self.simultaneous_cascade_steps = None
         self.defaulted_system_assets = 0
         self.system_assets_over_time = []
         self.df_over_time = []
     
-    def icc_cascade(self):
+    def icc_cascade(self, mode="simultaneous"):
+        """
+        Default cascade of a bank-asset network, in which defaulted banks
+        liquidate their investments and devaluate the assets. Update mode is
+        either 'simultaneous' or 'vectorized', which computes the same cascade
+        with sparse investment arrays (see cascade.icc_cascade).
+        """
+        if mode == "vectorized":
+            self._vectorized_icc_cascade()
+            return
+        if mode != "simultaneous":
+            raise ValueError(f"Update mode '{mode}' is unknown!")
         something_changed = True
         step = 0
+        self._liquidated_totals()
         self.system_assets_over_time.append(self.init_system_assets)
         while something_changed:
             # ab = self.get_largest()
@@ -453,6 +1017,7 @@ class Network():
                 if b_changed:
                     # print(f"{b.id_} defaulted")
                     b.defaulted = True
+                    self._liquidate(b)
                     update_assets.update(self.invs_of(b))
                     self.defaulted_system_assets += b.assets_tot()
             for a in update_assets:
@@ -461,6 +1026,40 @@ class Network():
             self.system_assets_over_time.append(current_system_assets)
         self.simultaneous_cascade_steps = step
             
+    def _vectorized_icc_cascade(self):
+        banks, assets = list(self.banks), list(self.ext_assets)
+        inv_b, inv_a, inv_w = self.investment_arrays(banks, assets)
+        inv_ptr = np.zeros(len(banks) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inv_b, minlength=len(banks)), out=inv_ptr[1:])
+        a_idx, b_idx, w = self.holding_arrays(banks, assets)
+        hold_ptr = np.zeros(len(assets) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(a_idx, minlength=len(assets)), out=hold_ptr[1:])
+        invested = np.array([self._invested[a] for a in assets], dtype=np.float64)
+        liquidated_totals = self._liquidated_totals()
+        liquidated = np.array([liquidated_totals[a] for a in assets], dtype=np.float64)
+        bs = np.array(
+            [[getattr(b, f) for b in banks] for f in BALANCE_SHEET_FIELDS], dtype=np.float64
+        ).reshape(len(BALANCE_SHEET_FIELDS), len(banks))
+        defaulted = np.array([b.defaulted for b in banks], dtype=bool)
+        shock_e = bs[BALANCE_SHEET_FIELDS.index("shock_e")]
+        init_defaulted, init_shock_e = defaulted.copy(), shock_e.copy()
+
+        phi = np.array([a.phi for a in assets], dtype=np.float64)
+        steps, self.defaulted_system_assets, profile = icc_cascade(
+            inv_ptr, inv_a, inv_w, hold_ptr, b_idx, w, bs, defaulted, phi,
+            invested, liquidated, exp_devaluation, defaulted_assets=self.defaulted_system_assets
+        )
+        for i in np.flatnonzero((defaulted != init_defaulted) | (shock_e != init_shock_e)).tolist():
+            banks[i].defaulted = bool(defaulted[i])
+            banks[i].shock_e = float(shock_e[i])
+        for a, lc, f in zip(assets, liquidated.tolist(), phi.tolist()):
+            self._liquidated[a] = lc
+            a.phi = f
+        self._liquidated_at = Bank.default_changes
+        self.system_assets_over_time.append(self.init_system_assets)
+        self.system_assets_over_time.extend(self.init_system_assets - da for da in profile)
+        self.simultaneous_cascade_steps = steps
+
     def _devaluate_asset(self, asset):
         phi_curr = asset.phi
         phi_new = asset.devaluate_exp(self.liquidated_fraction(asset)) # DEBUG
@@ -471,7 +1070,7 @@ class Network():
             new_shock = w * phi_curr - w * phi_new
             # print(new_shock / b.assets_tot())
             # print(f"  bank {b.id_} got new shock {new_shock}")
-            b.balance_sheet["shock_e"] += new_shock
+            b.shock_e += new_shock
 
     def icc_merge(self, acquiring, acquired):
         if acquiring == acquired:
@@ -489,78 +1088,129 @@ class Network():
                 new_w += self.get_inv_weight(acquiring, a)
             self.add_or_update_investment(acquiring, a, investment=new_w)
         acquiring.merge_state += acquired.merge_state + 1
+        self._push_largest(acquiring)
         self.remove_bank(acquired)
         self.merge_round += 1
 
     def merge(self, acquiring, acquired):
         """
         Merge two banks in the network. Merge is interpreted as the acquisition
-        of one bank by the other.
+        of one bank by the other. The adjacency of acquired is folded into the
+        one of acquiring and balance sheets are updated in bulk, so a merge
+        costs the degree of acquired.
+        Returns the surviving bank, which is acquiring.
         """
         if acquiring == acquired:
             raise ValueError("Bank can not acquire itself!")
-        # remember total assets of merging banks
-        a_tot = acquiring.assets_tot() + acquired.assets_tot()
-        # external balance sheet quantities are simply added
-        ing_bs, ed_bs = acquiring.balance_sheet, acquired.balance_sheet
-        ing_bs["assets_e"] += ed_bs["assets_e"]
-        ing_bs["assets_com"] += ed_bs["assets_com"]
-        ing_bs["liabilities_e"] += ed_bs["liabilities_e"]
-        ing_bs["shock"] += ed_bs["shock"]
-        ing_bs["shock_e"] += ed_bs["shock_e"]
-        # ing_bs["provision"] += ed_bs["provision"]
-        # handle interbank links
-        for suc, w in self.sucs_of(acquired, weight=True):
-            # TODO: maybe use try catch instead as add_link checks for selfloops
-            if suc == acquiring:
-                continue
-            new_w = w
-            if self.is_suc(acquiring, suc):
-                new_w += self.get_link_weight(acquiring, suc)
-            self.add_or_update_link(acquiring, suc, weight=new_w)
-        for pre, w in self.pres_of(acquired, weight=True):
-            if pre == acquiring:
-                continue
-            new_w = w
-            if self.is_pre(acquiring, pre):
-                new_w += self.get_link_weight(pre, acquiring)
-            self.add_or_update_link(pre, acquiring, weight=new_w)
-        acquiring.merge_state += acquired.merge_state + 1
-        self.remove_bank(acquired)
-        # correct total system assets
-        self.init_system_assets -= a_tot - acquiring.assets_tot()
+        if acquiring not in self.banks or acquired not in self.banks:
+            raise ValueError("Merging banks have to be in network!")
+        ing, ed = acquiring, acquired
+        self._merge_balance_sheets(ing, ed)
+        # fold adjacency of acquired into acquiring
+        self._fold_links(self._sucs, self._pres, ing, ed, self._in_degs)
+        self._fold_links(self._pres, self._sucs, ing, ed, self._out_degs)
+        if self._in_degs is not None:
+            for degs, adjacency in ((self._in_degs, self._pres), (self._out_degs, self._sucs)):
+                degs.remove(ed)
+                degs.remove(ing)
+                degs.add(ing, len(adjacency[ing]))
+        del self.banks[ed]
+        del self._bank_seq[ed]
+        self._push_largest(ing)
+        self._remove_investments(ed)
+        del self._bank_invest[ed]
         self.merge_round += 1
+        return ing
+
+    def _merge_balance_sheets(self, ing, ed):
+        """
+        Drops the links between ing and ed and adds the balance sheet and
+        merge state of ed to ing.
+        """
+        self._version += 1
+        # internal links vanish, their positions drop out of the interbank balance sheets
+        w_out = self._sucs[ing].pop(ed, None)
+        w_in = self._sucs[ed].pop(ing, None)
+        for w, u, v in ((w_out, ing, ed), (w_in, ed, ing)):
+            if w is not None:
+                del self._pres[v][u]
+                self.number_of_links -= 1
+        internal = (w_out or 0) + (w_in or 0)
+        a_tot = ing.assets_tot() + ed.assets_tot()
+        fields = dict(
+            assets_ib=ing.assets_ib + ed.assets_ib - internal,
+            assets_e=ing.assets_e + ed.assets_e,
+            assets_com=ing.assets_com + ed.assets_com,
+            liabilities_ib=ing.liabilities_ib + ed.liabilities_ib - internal,
+            liabilities_e=ing.liabilities_e + ed.liabilities_e,
+            shock=ing.shock + ed.shock,
+            shock_e=ing.shock_e + ed.shock_e
+        )
+        ing.merge_state += ed.merge_state + 1
+        ing.reset_temps()
+        ing.balance_sheet = fields
+        # correct total system assets
+        self.init_system_assets -= a_tot - ing.assets_tot()
 
-    def random_merge(self, rule, icc=False, **kwargs):
+    def _fold_links(self, out, into, ing, ed, into_degs=None):
+        """
+        Moves the links of ed in adjacency out to ing, adding up weights of
+        links to common neighbors, and drops ed from out. into is the reverse
+        adjacency and into_degs its degree index, if maintained.
+        """
+        ing_links, ed_links = out[ing], out.pop(ed)
+        for nb, w in ed_links.items():
+            nb_links = into[nb]
+            del nb_links[ed]
+            if nb in ing_links:
+                w += ing_links[nb]
+                self.number_of_links -= 1
+                if into_degs is not None:
+                    into_degs.shift(nb, -1)
+            ing_links[nb] = w
+            nb_links[ing] = w
+
+    def _remove_investments(self, bank):
+        """
+        Removes investments of bank from the asset side and the running totals.
+        """
+        for a, w in self._bank_invest[bank].items():
+            del self._asset_invest[a][bank]
+            self._invested[a] -= w
+            if bank.defaulted:
+                self._liquidated[a] -= w
+
+    def random_merge(self, rule, icc=False, rng=None, **kwargs):
         """
         Merge rules for random are:
             - "random": Fully randomly select merge parties
             - "vertical": Largest bank acquires randomly selected smaller bank
             - "semihorizontal": Only small banks may merge
+        Returns the surviving bank.
         """
-        acquiring, acquired = self._sample_banks_for_merge(rule, **kwargs)
+        acquiring, acquired = self._sample_banks_for_merge(rule, rng=rng, **kwargs)
         if icc:
             self.icc_merge(acquiring, acquired)
-        else:
-            self.merge(acquiring, acquired)
+            return acquiring
+        return self.merge(acquiring, acquired)
     
-    def _sample_banks_for_merge(self, rule, **kwargs):
+    def _sample_banks_for_merge(self, rule, rng=None, **kwargs):
         """
         Returns a tuple of banks.
         """
         if rule == "random":
-            b, d = sample_unique_pair(self.banks)
+            b, d = sample_unique_pair(self.banks, rng)
             return b, d
         if rule == "vertical":
             if "aquiring_bank" in kwargs:
                 lb = kwargs["aquiring_bank"]
             else:
                 lb = self.get_largest()
-            b = sample_except(self.banks, lb)
+            b = sample_except(self.banks, lb, rng)
             return lb, b # when passed to merge lb is acquiring
         if rule == "semihorizontal":
             if self._shmp_pairs is None:
-                self._shmp_pairs = random_pairs(self.banks)
+                self._shmp_pairs = random_pairs(self.banks, rng)
             if len(self._shmp_pairs) == 0:
                 raise ValueError("Can only perform semihorizontal if there are unmerged banks!")
             b, d = self._shmp_pairs.pop()
@@ -1,34 +1,406 @@
 import logging
 import os
 import json
+import math
+import copy
 import progressbar
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from gkmerge.generators import chung_lu, erdos_renyi, fast_erdos_renyi, directed_barabasi_albert
 from gkmerge.network import Network
+from gkmerge.csr_network import CSRNetwork
 
 from time import time
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
-    "ContagionWindow"
+    "ContagionWindow",
+    "merge_shards",
+    "JsonlSink",
+    "load_jsonl",
+    "write_columns",
+    "jsonl_to_columns"
 ]
 
+_worker_simulation = None
+
+
+def _init_worker(simulation):
+    global _worker_simulation
+    _worker_simulation = simulation
+
+
+def _run_units_in_worker(units):
+    return [_worker_simulation._run_seeded_unit(u) for u in units]
+
+
+def _dump(content, file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(content, f, ensure_ascii=False, indent=4)
+
+
+def merge_shards(shard_files, file_path):
+    """
+    Merge the files written by all shards of a sharded simulation run (see
+    Simulation.run) into file_path. The merged file is identical to the file
+    written by a single run of the simulation.
+    """
+    shards = []
+    for shard_file in shard_files:
+        with open(shard_file, encoding="utf-8") as f:
+            shards.append(json.load(f))
+    if any("shard" not in s for s in shards):
+        raise ValueError("Can only merge files written by sharded simulations!")
+    num_shards = shards[0]["shard"]["num_shards"]
+    if sorted(s["shard"]["index"] for s in shards) != list(range(num_shards)):
+        raise ValueError(f"Need exactly one file for each of the {num_shards} shards!")
+    attributes = shards[0]["attributes"]
+    if any(s["attributes"] != attributes for s in shards):
+        raise ValueError("Shards belong to different simulations!")
+    data = dict()
+    for key in shards[0]["data"]:
+        unit_records = []
+        for s in shards:
+            unit_records.extend(zip(s["shard"]["units"][key], s["data"][key]))
+        unit_records.sort(key=lambda ur: ur[0])
+        data[key] = [r for _, r in unit_records]
+    _dump(dict(attributes=attributes, data=data), file_path)
+
+
+class JsonlSink():
+    """
+    Writes a header record and then appended records as JSON Lines to
+    file_path. Records are buffered and written in batches of buffer_size, or
+    once flush_interval seconds have passed since the last write, so a crashed
+    run keeps all but the last batch. With truncate_at given, the existing
+    file is cut to that many bytes and appended to.
+    """
+    def __init__(self, file_path, buffer_size=1000, flush_interval=None, truncate_at=None):
+        self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.resumed = truncate_at is not None
+        self._buffer = []
+        if self.resumed:
+            os.truncate(file_path, truncate_at)
+        self._file = open(file_path, "a" if self.resumed else "w", encoding="utf-8")
+        self._last_flush = time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_header(self, header):
+        self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def append(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size or (
+            self.flush_interval is not None and time() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self._buffer))
+            self._buffer = []
+        self._file.flush()
+        self._last_flush = time()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def _jsonl_records(file_paths):
+    for file_path in file_paths:
+        with open(file_path, encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    if line.endswith("\n"):
+                        raise
+                    logger.warning(f"Skipping truncated last line of '{file_path}'.")
+
+
+def _scan_checkpoint(file_path):
+    """
+    Reads a file written by Simulation.run_and_stream. Records of its last
+    unit may be incomplete and are dropped, as is a truncated last line.
+    Returns (header, completed units, size in bytes of the kept lines).
+    """
+    completed, last = set(), None
+    with open(file_path, "rb") as f:
+        header = json.loads(f.readline())
+        last_start = f.tell()
+        while True:
+            start = f.tell()
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            u = json.loads(line)["unit"]
+            if u != last:
+                if last is not None:
+                    completed.add(last)
+                last, last_start = u, start
+    return header, completed, last_start
+
+
+def load_jsonl(file_paths):
+    """
+    Load the JSON Lines files written by Simulation.run_and_stream, e.g. one
+    per shard of a sharded run. Returns (attributes, data) where data is
+    {data key: [run data, ...], ...} in unit order, as in Simulation.data.
+    A truncated last line, as left by an interrupted run, is skipped.
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    header, records = None, []
+    for file_path in file_paths:
+        with open(file_path, encoding="utf-8") as f:
+            file_header = json.loads(f.readline())
+        if header is None:
+            header = file_header
+        elif file_header["attributes"] != header["attributes"]:
+            raise ValueError("Files belong to different simulations!")
+        records.extend(_jsonl_records([file_path]))
+    records.sort(key=lambda r: r["unit"])
+    data = {k: [] for k in header["keys"]}
+    for r in records:
+        data[r["key"]].append(r["data"])
+    return header["attributes"], data
+
+
+def _write_meta(path, attributes, counts, fields):
+    offsets = np.concatenate(([0], np.cumsum(list(counts.values()), dtype=int))).tolist()
+    _dump(
+        dict(attributes=attributes, keys=list(counts), offsets=offsets, fields=fields),
+        os.path.join(path, "meta.json")
+    )
+
+
+def write_columns(path, attributes, data):
+    """
+    Write data, {data key: [run data, ...], ...}, in columnar form to the
+    directory path: one .npy file of float64 per field of the run data, runs
+    grouped by data key, and meta.json holding attributes, keys, fields and
+    offsets, such that the runs of keys[i] are offsets[i]:offsets[i + 1].
+    Missing values are NaN. Load with data_tools.util.load_columns.
+    """
+    os.makedirs(path, exist_ok=True)
+    fields = list(dict.fromkeys(f for runs in data.values() for r in runs for f in r))
+    for f in fields:
+        column = np.array([r.get(f) for runs in data.values() for r in runs], dtype=float)
+        np.save(os.path.join(path, f"{f}.npy"), column)
+    _write_meta(path, attributes, {k: len(runs) for k, runs in data.items()}, fields)
+
+
+def jsonl_to_columns(file_paths, path):
+    """
+    Convert the JSON Lines files of a streamed run (see load_jsonl), e.g. one
+    per shard, to columnar form (see write_columns). Columns are filled
+    through memory maps, runs are not held in memory.
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    headers = []
+    for file_path in file_paths:
+        with open(file_path, encoding="utf-8") as f:
+            headers.append(json.loads(f.readline()))
+    if any(h["attributes"] != headers[0]["attributes"] for h in headers):
+        raise ValueError("Files belong to different simulations!")
+    # shards hold contiguous blocks of units, so records are in unit order
+    order = sorted(range(len(headers)), key=lambda i: headers[i].get("shard", {}).get("index", 0))
+    counts, fields = {k: 0 for k in headers[0]["keys"]}, {}
+    for record in _jsonl_records(file_paths[i] for i in order):
+        counts[record["key"]] += 1
+        fields.update(dict.fromkeys(record["data"]))
+    os.makedirs(path, exist_ok=True)
+    columns = {
+        f: np.lib.format.open_memmap(
+            os.path.join(path, f"{f}.npy"), mode="w+", dtype=float, shape=(sum(counts.values()),)
+        )
+        for f in fields
+    }
+    cursor = dict(zip(counts, np.cumsum([0] + list(counts.values())[:-1]).tolist()))
+    for record in _jsonl_records(file_paths[i] for i in order):
+        i = cursor[record["key"]]
+        cursor[record["key"]] += 1
+        for f, column in columns.items():
+            v = record["data"].get(f)
+            column[i] = np.nan if v is None else v
+    for column in columns.values():
+        column.flush()
+    _write_meta(path, headers[0]["attributes"], counts, list(fields))
+
+
 class Simulation():
+    """
+    Base class of simulations. A simulation is split into independent work
+    units (see _number_of_units and _run_unit), which are run serially or on
+    a process pool and merged into self.data in unit order. If attr holds a
+    seed, unit u draws from its own numpy Generator seeded with the u-th child
+    of SeedSequence(seed) (as given by SeedSequence.spawn), so the data does
+    not depend on the number of workers or shards.
+    """
     def __init__(self, write_path=None, **attr):
         self.attr = dict(attr)
         self.data = dict()
+        self._shard = None
+        self._record_units = dict()
+        self._sink = None
+        self._completed_units = set()
         if write_path is not None:
             self.write_path = write_path
         else:
             self.write_path = os.path.expanduser("~")
     
-    def run(self):
-        raise NotImplementedError("Not implemented by Simulation base class!")
+    def run(self, workers=None, shard_index=None, num_shards=None):
+        """
+        Run simulation. If workers > 1, chunks of work units are distributed over
+        a process pool of that size. Without seed in attr, a seed is drawn and
+        stored in attr in that case, as workers would share the random state.
+
+        With num_shards given, only the shard_index-th of num_shards contiguous
+        blocks of work units is run. Sharded runs need a seed, their files are
+        combined with merge_shards.
+        """
+        number_of_units = self._number_of_units()
+        units = range(number_of_units)
+        if num_shards is not None:
+            if shard_index is None or not 0 <= shard_index < num_shards:
+                raise ValueError(f"Shard index must be in [0, {num_shards}), not {shard_index}!")
+            if self.attr.get("seed") is None:
+                raise ValueError("Sharded simulations need a seed!")
+            units = units[
+                shard_index * number_of_units // num_shards:
+                (shard_index + 1) * number_of_units // num_shards
+            ]
+            self._shard = (shard_index, num_shards)
+        else:
+            self._shard = None
+        if self._completed_units:
+            units = [u for u in units if u not in self._completed_units]
+        if workers is not None and workers > 1 and self.attr.get("seed") is None:
+            self.attr["seed"] = int(np.random.SeedSequence().entropy)
+        self._setup_data_dict()
+        if self._sink is not None and not self._sink.resumed:
+            self._sink.write_header(self._stream_header(self._shard))
+        progbar = self.setup_progressbar(max(len(units), 1))
+        progbar.start()
+        if workers is None or workers <= 1:
+            for i, u in enumerate(units):
+                self._collect(u, self._run_seeded_unit(u))
+                progbar.update(i + 1)
+        else:
+            chunk_size = max(1, math.ceil(len(units) / (4 * workers)))
+            chunks = [units[i:i + chunk_size] for i in range(0, len(units), chunk_size)]
+            worker_sim = copy.copy(self)
+            worker_sim.data = dict()
+            worker_sim._record_units = dict()
+            worker_sim._sink = None
+            finished, next_chunk, done = {}, 0, 0
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(worker_sim,)) as ex:
+                futures = {ex.submit(_run_units_in_worker, chunk): i for i, chunk in enumerate(chunks)}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    finished[i] = future.result()
+                    done += len(chunks[i])
+                    progbar.update(done)
+                    # merge in unit order
+                    while next_chunk in finished:
+                        for u, unit_records in zip(chunks[next_chunk], finished.pop(next_chunk)):
+                            self._collect(u, unit_records)
+                        next_chunk += 1
+        progbar.finish()
 
-    def run_and_write(self, file_name):
-        self.run()
+    def run_and_write(self, file_name, workers=None, shard_index=None, num_shards=None):
+        self.run(workers=workers, shard_index=shard_index, num_shards=num_shards)
         self.write(file_name)
+
+    def run_and_stream(
+        self, file_name, workers=None, shard_index=None, num_shards=None,
+        buffer_size=1000, flush_interval=None, resume=False
+    ):
+        """
+        Run simulation and append the records of each finished unit to the JSON
+        Lines file file_name.jsonl in write_path (see JsonlSink) instead of
+        keeping them in self.data. Load the file(s) with load_jsonl.
+
+        The file doubles as checkpoint, flushed every buffer_size records or
+        flush_interval seconds. Without seed in attr, a seed is drawn and
+        stored in attr. With resume=True, the units completed in an existing
+        file are skipped, which gives the same file as an uninterrupted run.
+        """
+        if file_name[-6:] == ".jsonl":
+            file_name = file_name[:-6]
+        file_path = os.path.join(self.write_path, f"{file_name}.jsonl")
+        truncate_at = None
+        if resume and os.path.exists(file_path):
+            header, completed, truncate_at = _scan_checkpoint(file_path)
+            if self.attr.get("seed") is None:
+                self.attr["seed"] = header["attributes"].get("seed")
+            shard = None if num_shards is None else (shard_index, num_shards)
+            if json.loads(json.dumps(self._stream_header(shard))) != header:
+                raise ValueError(f"'{file_path}' belongs to a different simulation!")
+            self._completed_units = completed
+            logger.info(f"Resuming from '{file_path}' with {len(completed)} completed units.")
+        elif self.attr.get("seed") is None:
+            self.attr["seed"] = int(np.random.SeedSequence().entropy)
+        try:
+            with JsonlSink(file_path, buffer_size, flush_interval, truncate_at) as sink:
+                self._sink = sink
+                self.run(workers=workers, shard_index=shard_index, num_shards=num_shards)
+        finally:
+            self._sink = None
+            self._completed_units = set()
+        print(f"--- Data successfully written to '{file_path}'! ---")
+
+    def _stream_header(self, shard):
+        header = dict(attributes=self.attr, keys=list(self._data_keys()))
+        if shard is not None:
+            header.update(shard=dict(index=shard[0], num_shards=shard[1]))
+        return header
+
+    def _number_of_units(self):
+        raise NotImplementedError("Not implemented by Simulation base class!")
+
+    def _run_unit(self, u, rng):
+        """
+        Run work unit u drawing from rng (None for the global random state) and
+        return its records as list of (data key, run data).
+        """
+        raise NotImplementedError("Not implemented by Simulation base class!")
+
+    def _data_keys(self):
+        raise NotImplementedError("Not implemented by Simulation base class!")
+
+    def _setup_data_dict(self):
+        self.data = {k: [] for k in self._data_keys()}
+        self._record_units = {k: [] for k in self._data_keys()}
+
+    def _run_seeded_unit(self, u):
+        seed = self.attr.get("seed")
+        rng = None
+        if seed is not None:
+            rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(u,)))
+        return self._run_unit(u, rng)
+
+    def _collect(self, u, records):
+        if self._sink is not None:
+            for key, data in records:
+                self._sink.append(dict(unit=u, key=key, data=data))
+            return
+        for key, data in records:
+            self.data[key].append(data)
+            self._record_units[key].append(u)
     
     def setup_progressbar(self, maxval):
         return progressbar.ProgressBar(maxval=maxval, widgets=[
@@ -53,11 +425,24 @@ class Simulation():
     def write(self, file_name):
         if file_name[-5:] == ".json":
             file_name = file_name[:-5]
-        file_path = os.path.join(self.write_path, f"{file_name}.json")
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(dict(attributes=self.attr, data=self.data), f, ensure_ascii=False, indent=4)
+        content = dict(attributes=self.attr, data=self.data)
+        if self._shard is not None:
+            content.update(shard=dict(
+                index=self._shard[0], num_shards=self._shard[1], units=self._record_units
+            ))
+        _dump(content, os.path.join(self.write_path, f"{file_name}.json"))
         print(f"--- Data successfully written to '{os.path.join(self.write_path, file_name)}'! ---")
 
+    def write_columns(self, dir_name):
+        """
+        Write self.data in columnar form to the directory dir_name in write_path
+        (see write_columns). Streamed and sharded runs are converted with
+        jsonl_to_columns.
+        """
+        path = os.path.join(self.write_path, dir_name)
+        write_columns(path, self.attr, self.data)
+        print(f"--- Data successfully written to '{path}'! ---")
+
 
 class ContagionWindow(Simulation):
     """
@@ -85,54 +470,53 @@ class ContagionWindow(Simulation):
     def __init__(self, write_path=None, **attr):
         super().__init__(write_path=write_path, **attr)
         self._network_gen = None
-        self._progbar_max = 0
         self._z_modifiers = []
     
     def use_erdos_renyi(
         self, n=1000, p_min=0, p_max=0.01, p_points=25,
         runs=1000, alpha=0.2, kappa=0.04, shock_mode="random",
         contagion_mode="simultaneous", recovery_rate=0,
-        deprecation_factor=0.0, c=0.0
+        deprecation_factor=0.0, c=0.0, csr=False, shocks_per_network=1, shock_k=1
     ):
         p_vals = self.point_range(p_min, p_max, p_points)
         self.attr.update(
             gen="erdos_renyi", n=n, p_min=p_min, p_max=p_max, p_points=p_points,
             p_vals=p_vals, runs=runs, alpha=alpha, kappa=kappa, shock_mode=shock_mode,
             contagion_mode=contagion_mode, recovery_rate=recovery_rate,
-            deprecation_factor=deprecation_factor, c=c
+            deprecation_factor=deprecation_factor, c=c, csr=csr,
+            shocks_per_network=shocks_per_network, shock_k=shock_k
         )
         self._network_gen = "er"
-        self._progbar_max = p_points
         self._z_modifiers = p_vals
     
     def use_chung_lu(
         self, n=1000, z_min=0, z_max=12, z_points=25,
         gamma=3, runs=1000, alpha=0.2, kappa=0.04, shock_mode="random", 
         contagion_mode="simultaneous", recovery_rate=0,
-        deprecation_factor=0.0, c=0.0
+        deprecation_factor=0.0, c=0.0, csr=False, shocks_per_network=1, shock_k=1
     ):
         z_vals = self.point_range(z_min, z_max, z_points)
         self.attr.update(
             gen="chung_lu", n=n, z_min=z_min, z_max=z_max, z_points=z_points, gamma=gamma,
             z_vals=z_vals, runs=runs, alpha=alpha, kappa=kappa, shock_mode=shock_mode, 
             contagion_mode=contagion_mode, recovery_rate=recovery_rate,
-            deprecation_factor=deprecation_factor, c=c
+            deprecation_factor=deprecation_factor, c=c, csr=csr,
+            shocks_per_network=shocks_per_network, shock_k=shock_k
         )
         self._network_gen = "cl"
-        self._progbar_max = z_points
         self._z_modifiers = z_vals
     
-    def _setup_network(self, x):
+    def _setup_network(self, x, rng=None):
         if self._network_gen == "er":
             return fast_erdos_renyi(
                 self.attr["n"], x, alpha=self.attr["alpha"], kappa=self.attr["kappa"],
-                c=self.attr["c"]
+                c=self.attr["c"], csr=self.attr["csr"], rng=rng
             )
         if self._network_gen == "cl":
             return chung_lu(
                 self.attr["n"], x, gamma=self.attr["gamma"],
                 alpha=self.attr["alpha"], kappa=self.attr["kappa"],
-                c=self.attr["c"]
+                c=self.attr["c"], csr=self.attr["csr"], rng=rng
             )
         else:
             raise SystemError("Network generator not yet set up.")
@@ -148,33 +532,53 @@ class ContagionWindow(Simulation):
             data.update(steps=steps)
         return data
     
-    def run(self):
+    def _networks_per_point(self):
+        return math.ceil(self.attr["runs"] / self.attr.get("shocks_per_network", 1))
+
+    def _number_of_units(self):
         if self._network_gen is None:
             raise SystemError("Network generator not yet set up.")
-        progbar = self.setup_progressbar(self._progbar_max)
-        progbar.start()
-        for i, x in enumerate(self._z_modifiers):
-            progbar.update(i + 1)
-            x_data = []
-            for _ in range(self.attr["runs"]):
-                progbar.update()
-                network = self._setup_network(x)
-                sm = self.attr["shock_mode"]
-                if sm == "random":
-                    sb = network.shock_random()
-                elif sm == "max_in_deg":
-                    sb = network.shock_max_in_deg()
-                else:
-                    raise SystemError("Unknown shock mode!")
-                network.cascade(
-                    sb,
-                    mode=self.attr["contagion_mode"],
-                    recovery_rate=self.attr["recovery_rate"],
-                    deprecation_factor=self.attr["deprecation_factor"]
-                )
-                x_data.append(self._fetch_rundata(network))
-            self.add_data(x, x_data)
-        progbar.finish()
+        return len(self._z_modifiers) * self._networks_per_point()
+
+    def _data_keys(self):
+        return self._z_modifiers
+
+    def _run_unit(self, u, rng):
+        """
+        Generates one network and runs up to shocks_per_network cascades on it,
+        restoring the initial state before each shock. A CSRNetwork restores a
+        snapshot of its state arrays, a Network resets its banks.
+        """
+        x_index, k = divmod(u, self._networks_per_point())
+        x = self._z_modifiers[x_index]
+        spn = self.attr.get("shocks_per_network", 1)
+        network = self._setup_network(x, rng)
+        initial_state = None
+        if spn > 1 and isinstance(network, CSRNetwork):
+            initial_state = network.snapshot_state()
+        records = []
+        for i in range(min(spn, self.attr["runs"] - k * spn)):
+            if i > 0 and initial_state is not None:
+                network.restore_state(initial_state)
+            elif i > 0:
+                network.reset_cascade()
+            sm = self.attr["shock_mode"]
+            if sm == "random":
+                sb = network.shock_random(rng)
+            elif sm == "max_in_deg":
+                sb = network.shock_max_in_deg()
+            elif sm == "kth_in_deg":
+                sb = network.shock_kth_in_deg(self.attr.get("shock_k", 1))
+            else:
+                raise SystemError("Unknown shock mode!")
+            network.cascade(
+                sb,
+                mode=self.attr["contagion_mode"],
+                recovery_rate=self.attr["recovery_rate"],
+                deprecation_factor=self.attr["deprecation_factor"]
+            )
+            records.append((x, self._fetch_rundata(network)))
+        return records
 
 
 class ContinousMergers(Simulation):
@@ -193,13 +597,9 @@ class ContinousMergers(Simulation):
     def __init__(self, write_path=None, **attr):
         super().__init__(write_path=write_path, **attr)
         self._network_gen = None
-        self._progbar_max = 0
     
-    def _append_to_mr_data(self, mr, realization_data_set):
-        self.data[mr].append(realization_data_set)
-    
-    def _setup_data_dict(self):
-        self.data = {mr: [] for mr in self.attr["mr_vals"]}
+    def _data_keys(self):
+        return self.attr["mr_vals"]
     
     def use_erdos_renyi(
         self, n=1000, p=0.005, mr_min=0, mr_max=500, mr_points=20,
@@ -216,7 +616,6 @@ class ContinousMergers(Simulation):
 
         )
         self._network_gen = "er"
-        self._progbar_max = runs
         self._z_modifier = p
         self._setup_data_dict()
     
@@ -235,14 +634,13 @@ class ContinousMergers(Simulation):
 
         )
         self._network_gen = "cl"
-        self._progbar_max = runs
         self._z_modifier = z
         self._setup_data_dict()
     
-    def contagion_analysis(self, net: Network, mr):
+    def contagion_analysis(self, net: Network, mr, rng=None):
         sm = self.attr["shock_mode"]
         if sm == "random":
-            sb = net.shock_random()
+            sb = net.shock_random(rng)
         else:
             raise SystemError("Unknown shock mode!")
         net.cascade(
@@ -258,38 +656,35 @@ class ContinousMergers(Simulation):
             z=net.z(),
             lb_def=int(lb.defaulted)
         )
-        self._append_to_mr_data(mr, data_set)
         net.reset_cascade()
+        return data_set
     
-    def _setup_network(self):
+    def _setup_network(self, rng=None):
         if self._network_gen == "er":
             return fast_erdos_renyi(
                 self.attr["n"], self._z_modifier,
-                alpha=self.attr["alpha"], kappa=self.attr["kappa"], c=self.attr["c"]
+                alpha=self.attr["alpha"], kappa=self.attr["kappa"], c=self.attr["c"], rng=rng
             )
         if self._network_gen == "cl":
             return chung_lu(
                 self.attr["n"], self._z_modifier, gamma=self.attr["gamma"],
-                alpha=self.attr["alpha"], kappa=self.attr["kappa"], c=self.attr["c"]
+                alpha=self.attr["alpha"], kappa=self.attr["kappa"], c=self.attr["c"], rng=rng
             )
         else:
             raise SystemError("Network generator not yet set up.")
     
-    def run(self):
+    def _number_of_units(self):
         if self._network_gen is None:
             raise SystemError("Network generator not yet set up.")
-        progbar = self.setup_progressbar(self._progbar_max)
-        progbar.start()
-        for i in range(self.attr["runs"]):
-            # print(i)
-            progbar.update(i + 1)
-            mr_vals = list(self.attr["mr_vals"])
-            net = self._setup_network()
-            while mr_vals:
-                progbar.update()
-                next_mr = mr_vals.pop(0)
-                # print(next_mr)
-                while net.merge_round < next_mr:
-                    net.random_merge(self.attr["merge_rule"])
-                self.contagion_analysis(net, next_mr)
-        progbar.finish()
+        return self.attr["runs"]
+
+    def _run_unit(self, u, rng):
+        records = []
+        mr_vals = list(self.attr["mr_vals"])
+        net = self._setup_network(rng)
+        while mr_vals:
+            next_mr = mr_vals.pop(0)
+            while net.merge_round < next_mr:
+                net.random_merge(self.attr["merge_rule"], rng=rng)
+            records.append((next_mr, self.contagion_analysis(net, next_mr, rng)))
+        return records
@@ -0,0 +1,270 @@
+import copy
+import random
+import unittest
+import numpy as np
+from gkmerge.bank import Bank, BALANCE_SHEET_FIELDS
+from gkmerge.csr_network import CSRNetwork
+from gkmerge.network import Network
+from gkmerge.generators import fast_erdos_renyi, bipartite_erdos_renyi, init_balance_sheets_dcc
+from gkmerge.util import sample_unique_pair
+
+
+def cascade_result(net):
+    return (
+        net.defaulted_fraction(), net.defaulted_asset_fraction(),
+        net.simultaneous_cascade_steps
+    )
+
+
+class TestVectorizedCascade(unittest.TestCase):
+    def setUp(self):
+        random.seed(42)
+        np.random.seed(42)
+        self.networks = [
+            fast_erdos_renyi(100, p, alpha=0.2, kappa=0.04, c=0.3)
+            for p in (0.005, 0.01, 0.02, 0.04) for _ in range(5)
+        ]
+
+    def _compare(self, mode, **kwargs):
+        for net in self.networks:
+            other = copy.deepcopy(net)
+            sb = net.shock_random()
+            other_sb = other.banks_by_id[sb.id_]
+            other_sb.aggregate_shock()
+            net.cascade(sb, mode="simultaneous", **kwargs)
+            other.cascade(other_sb, mode=mode, **kwargs)
+            self.assertEqual(cascade_result(net), cascade_result(other))
+
+    def test_vectorized(self):
+        self._compare("vectorized")
+
+    def test_vectorized_fire_sales(self):
+        self._compare("vectorized", recovery_rate=0.2, deprecation_factor=0.1)
+
+    def test_cached_csr_view(self):
+        rng = np.random.default_rng(10)
+        net = fast_erdos_renyi(100, 0.02, alpha=0.2, kappa=0.04, c=0.3, rng=rng)
+        other = copy.deepcopy(net)
+        for i in range(6):
+            if i % 2:
+                u, v = sample_unique_pair(net.banks, rng)
+                for n in (net, other):
+                    n.add_or_update_link(n.banks_by_id[u.id_], n.banks_by_id[v.id_], weight=5)
+            sb = net.shock_random(rng)
+            other.banks_by_id[sb.id_].aggregate_shock()
+            net.cascade(sb, mode="vectorized", deprecation_factor=0.05)
+            other.cascade(None, mode="simultaneous", deprecation_factor=0.05)
+            self.assertEqual(cascade_result(net), cascade_result(other))
+            net.reset_cascade()
+            other.reset_cascade()
+
+    def test_reinitialized_balance_sheets(self):
+        rng = np.random.default_rng(12)
+        net = fast_erdos_renyi(100, 0.05, alpha=0.05, kappa=0.04, c=0.3, rng=rng)
+        net.cascade(net.shock_random(rng), mode="vectorized")
+        net.reset_cascade()
+        # link weights change without links being added or removed
+        init_balance_sheets_dcc(net, 0.6, 0.02, 0.3)
+        other = copy.deepcopy(net)
+        sb = net.shock_random(rng)
+        other.banks_by_id[sb.id_].aggregate_shock()
+        net.cascade(sb, mode="vectorized")
+        other.cascade(None, mode="simultaneous")
+        self.assertGreater(other.defaulted_fraction(), 0.5)
+        self.assertEqual(cascade_result(net), cascade_result(other))
+
+    def test_csr_network(self):
+        for net in self.networks:
+            csr = CSRNetwork.from_network(net)
+            sb = net.shock_random()
+            csr.aggregate_shock(list(net.banks).index(sb))
+            net.cascade(sb, mode="simultaneous", deprecation_factor=0.05)
+            csr.cascade(mode="simultaneous", deprecation_factor=0.05)
+            self.assertEqual(cascade_result(net), cascade_result(csr))
+
+    def test_frontier(self):
+        self._compare("frontier")
+
+    def test_frontier_fire_sales(self):
+        self._compare("frontier", recovery_rate=0.2, deprecation_factor=0.1)
+
+    def test_frontier_insertion_order(self):
+        # banks added in another order than their ids, shocks and r_vals depend on the update order
+        rng = np.random.default_rng(11)
+        for net in self.networks:
+            shuffled = Network()
+            banks = list(net.banks)
+            shuffled.add_banks_from(banks[i] for i in rng.permutation(len(banks)).tolist())
+            for u, v in net.links:
+                shuffled.add_or_update_link(u, v, net.get_link_weight(u, v), update_balance_sheets=False)
+            shuffled.init_system_assets = net.init_system_assets
+            other = copy.deepcopy(shuffled)
+            sb = shuffled.shock_random(rng)
+            other_sb = other.banks_by_id[sb.id_]
+            other_sb.aggregate_shock()
+            shuffled.cascade(sb, mode="simultaneous", recovery_rate=0.2, deprecation_factor=0.1)
+            other.cascade(other_sb, mode="frontier", recovery_rate=0.2, deprecation_factor=0.1)
+            self.assertEqual(cascade_result(shuffled), cascade_result(other))
+            self.assertListEqual(
+                [(b.shock, b.shock_e, b.r_val) for b in shuffled.banks],
+                [(b.shock, b.shock_e, b.r_val) for b in other.banks]
+            )
+
+
+class TestSequentialCascade(unittest.TestCase):
+    def test_sequential(self):
+        rng = np.random.default_rng(5)
+        for p in (0.005, 0.01, 0.02, 0.04):
+            for deprecation_factor in (0, 0.05, 0.2):
+                net = fast_erdos_renyi(200, p, alpha=0.2, kappa=0.04, c=0.3, rng=rng)
+                other, csr = copy.deepcopy(net), CSRNetwork.from_network(net)
+                sb = net.shock_random(rng)
+                i = list(net.banks).index(sb)
+                other.banks_by_id[sb.id_].aggregate_shock()
+                csr.aggregate_shock(i)
+                kwargs = dict(recovery_rate=0.1, deprecation_factor=deprecation_factor)
+                net.cascade(sb, mode="sequential", **kwargs)
+                other.cascade(None, mode="simultaneous", **kwargs)
+                csr.cascade(i, mode="sequential", **kwargs)
+                # final defaults do not depend on the update order
+                self.assertEqual(net.defaulted_fraction(), other.defaulted_fraction())
+                self.assertEqual(net.defaulted_fraction(), csr.defaulted_fraction())
+                self.assertAlmostEqual(net.defaulted_asset_fraction(), other.defaulted_asset_fraction())
+                self.assertTrue(np.allclose(
+                    [[getattr(b, f) for b in net.banks] for f in BALANCE_SHEET_FIELDS],
+                    csr.balance_sheets
+                ))
+                self.assertFalse(np.any(csr._queued))
+
+
+class TestBatchedCascade(unittest.TestCase):
+    def test_batched_cascade(self):
+        random.seed(7)
+        np.random.seed(7)
+        for p in (0.01, 0.02):
+            net = fast_erdos_renyi(100, p, alpha=0.2, kappa=0.04, c=0.3)
+            shock_banks = [net.banks.random_key() for _ in range(10)]
+            res = net.batched_cascade(shock_banks, deprecation_factor=0.05)
+            for k, sb in enumerate(shock_banks):
+                other = copy.deepcopy(net)
+                other_sb = other.banks_by_id[sb.id_]
+                other_sb.aggregate_shock()
+                other.cascade(other_sb, deprecation_factor=0.05)
+                self.assertEqual(
+                    cascade_result(other), (res["df"][k], res["af"][k], res["steps"][k])
+                )
+
+    def test_max_in_deg(self):
+        random.seed(8)
+        np.random.seed(8)
+        net = fast_erdos_renyi(100, 0.02, alpha=0.2, kappa=0.04)
+        res = net.batched_cascade("max_in_deg", runs=3)
+        self.assertEqual(len(set(res["df"].tolist())), 1)
+        sb = net.shock_max_in_deg()
+        net.cascade(sb)
+        self.assertEqual(net.defaulted_fraction(), res["df"][0])
+
+
+class TestIccCascade(unittest.TestCase):
+    def test_vectorized(self):
+        rng = np.random.default_rng(4)
+        for mu_b in (1, 2, 4, 8):
+            for _ in range(5):
+                net = bipartite_erdos_renyi(200, 20, mu_b, alpha=0.6, kappa=0.04, rng=rng)
+                other = copy.deepcopy(net)
+                sb = net.shock_random(rng)
+                other.banks_by_id[sb.id_].aggregate_shock()
+                net.icc_cascade()
+                other.icc_cascade(mode="vectorized")
+                self.assertEqual(cascade_result(net), cascade_result(other))
+                self.assertListEqual(net.system_assets_over_time, other.system_assets_over_time)
+                self.assertListEqual(
+                    [a.phi for a in net.ext_assets], [a.phi for a in other.ext_assets]
+                )
+
+    def test_liquidated_totals(self):
+        rng = np.random.default_rng(6)
+        net = bipartite_erdos_renyi(100, 10, 4, alpha=0.6, kappa=0.04, rng=rng)
+        for _ in range(10):
+            net.icc_merge(*sample_unique_pair(net.banks, rng))
+        net.shock_random(rng)
+        net.icc_cascade()
+        self.assertGreater(net.defaulted_fraction(), 0)
+        self._check_liquidated(net)
+        net.reset_cascade()
+        self.assertTrue(all(net.liquidated_fraction(a) == 0 for a in net.ext_assets))
+
+    def test_liquidated_totals_other_defaults(self):
+        rng = np.random.default_rng(7)
+        net = bipartite_erdos_renyi(100, 10, 4, alpha=0.6, kappa=0.04, rng=rng)
+        for mode in ("simultaneous", "frontier", "sequential", "vectorized"):
+            net.cascade(net.shock_random(rng), mode=mode)
+            self.assertGreater(net.defaulted_fraction(), 0)
+            self._check_liquidated(net)
+            net.reset_cascade()
+        b = next(iter(net.banks))
+        b.defaulted = True
+        self.assertTrue(any(net.liquidated_fraction(a) > 0 for a in net.invs_of(b)))
+        self._check_liquidated(net)
+        b.defaulted = False
+        self._check_liquidated(net)
+
+    def _check_liquidated(self, net):
+        for a in net.ext_assets:
+            invs = net._asset_invest[a].items()
+            expected = sum(w for b, w in invs if b.defaulted) / sum(w for _, w in invs)
+            self.assertAlmostEqual(net.liquidated_fraction(a), expected)
+
+
+class TestSnapshotState(unittest.TestCase):
+    def test_restore_state(self):
+        rng = np.random.default_rng(3)
+        net = fast_erdos_renyi(100, 0.03, alpha=0.2, kappa=0.04, c=0.2, csr=True, rng=rng)
+        fresh = copy.deepcopy(net)
+        state = net.snapshot_state()
+        net.cascade(net.shock_random(np.random.default_rng(0)), deprecation_factor=0.1)
+        net.restore_state(state)
+        for other in (net, fresh):
+            other.cascade(other.shock_random(np.random.default_rng(1)), deprecation_factor=0.1)
+        self.assertEqual(cascade_result(net), cascade_result(fresh))
+        self.assertTrue(np.array_equal(net.balance_sheets, fresh.balance_sheets))
+
+    def test_changed_network(self):
+        net = fast_erdos_renyi(10, 0.1, csr=True, rng=np.random.default_rng(0))
+        state = net.snapshot_state()
+        net.remove_bank(0)
+        self.assertRaises(ValueError, net.restore_state, state)
+
+
+class TestBankState(unittest.TestCase):
+    def test_balance_sheet_view(self):
+        b = Bank()
+        b.balance_sheet.update(assets_ib=20, assets_e=80, liabilities_ib=10, liabilities_e=70)
+        self.assertEqual(b.assets_tot(), 100)
+        self.assertEqual(b.balance_sheet["liabilities_e"], 70)
+        self.assertEqual(dict(b.balance_sheet), dict(zip(BALANCE_SHEET_FIELDS, (20, 80, 0, 10, 70, 0, 0))))
+        b.balance_sheet.update(provision=10)
+        self.assertEqual(b.balance_sheet["provision"], 10)
+        self.assertEqual(b.capital(), 20)
+        self.assertRaises(TypeError, b.balance_sheet.__delitem__, "shock")
+        b.temp_balance_sheet = dict(b.balance_sheet, shock=25)
+        self.assertEqual(b.capital(temp=True), -5)
+        self.assertEqual(b.shock, 0)
+        b.temp_balance_sheet = None
+        self.assertIsNone(b.temp_balance_sheet)
+
+    def test_pending_shocks(self):
+        pre, b = Bank(), Bank()
+        b.balance_sheet.update(assets_ib=20, assets_e=80, liabilities_ib=10, liabilities_e=70)
+        self.assertIsNone(b.temp_balance_sheet)
+        pre._simultaneous_update([(b, 15)], recovery_rate=0)
+        self.assertEqual(b.temp_balance_sheet["shock"], 15)
+        self.assertEqual(b.capital(temp=True), 5)
+        pre._simultaneous_update([(b, 10)], recovery_rate=0)
+        self.assertEqual(pre.r_val, 1)
+        self.assertEqual(b.shock, 0)
+        b.commit_temps()
+        pre.commit_temps()
+        self.assertTrue(pre.defaulted)
+        self.assertEqual(b.shock, 25)
+        self.assertIsNone(b.temp_balance_sheet)
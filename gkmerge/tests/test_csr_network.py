@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from gkmerge.csr_network import CSRNetwork
+from gkmerge.generators import fast_erdos_renyi
+
+
+class TestCSRNetwork(unittest.TestCase):
+    def setUp(self):
+        # 0 -> 1, 0 -> 2, 1 -> 2, 2 -> 0
+        self.net = CSRNetwork.from_edges(3, [0, 0, 1, 2], [1, 2, 2, 0], [1., 2., 3., 4.])
+
+    def test_degrees(self):
+        self.assertEqual(self.net.out_deg_of(0), 2)
+        self.assertEqual(self.net.in_deg_of(2), 2)
+        self.assertListEqual(self.net.in_degrees().tolist(), [1, 1, 2])
+
+    def test_sucs_and_pres(self):
+        self.assertListEqual(self.net.sucs_of(0, weight=True), [(1, 1.), (2, 2.)])
+        self.assertListEqual(self.net.pres_of(2, weight=True), [(0, 2.), (1, 3.)])
+
+    def test_add_or_update_link(self):
+        self.net.add_or_update_link(1, 0, weight=5)
+        self.net.add_or_update_link(0, 1, weight=3)
+        self.assertEqual(self.net.number_of_links, 5)
+        self.assertListEqual(self.net.pres_of(0, weight=True), [(1, 5.), (2, 4.)])
+        self.assertEqual(self.net.field("liabilities_ib")[0], 2)
+        self.assertEqual(self.net.field("assets_ib")[0], 5)
+
+    def test_remove_bank(self):
+        self.net = CSRNetwork.from_edges(3, [0, 0, 1, 2], [1, 2, 2, 0])
+        self.net.set_link_weights([1., 2., 3., 4.])
+        self.net.remove_bank(2)
+        self.assertEqual(self.net.number_of_banks, 2)
+        self.assertEqual(self.net.number_of_links, 1)
+        self.assertListEqual(self.net.links, [(0, 1)])
+        self.assertEqual(self.net.field("liabilities_ib")[0], 1)
+        self.assertRaises(ValueError, self.net.sucs_of, 2)
+
+    def test_duplicate_links(self):
+        self.assertRaises(ValueError, CSRNetwork.from_edges, 2, [0, 0], [1, 1])
+
+    def test_from_network(self):
+        np.random.seed(0)
+        net = fast_erdos_renyi(50, 0.1, alpha=0.2, kappa=0.04, c=0.1)
+        csr = CSRNetwork.from_network(net)
+        for i, b in enumerate(net.banks):
+            self.assertEqual(csr.in_deg_of(i), net.in_deg_of(b))
+            self.assertEqual(csr.balance_sheet_of(i), b.balance_sheet)
+
+    def test_fast_erdos_renyi_csr(self):
+        np.random.seed(1)
+        net = fast_erdos_renyi(50, 0.1, alpha=0.2, kappa=0.04, c=0.1)
+        np.random.seed(1)
+        csr = fast_erdos_renyi(50, 0.1, alpha=0.2, kappa=0.04, c=0.1, csr=True)
+        self.assertEqual(csr.number_of_links, net.number_of_links)
+        self.assertEqual(csr.init_system_assets, net.init_system_assets)
+        capital = [b.capital() for b in net.banks]
+        self.assertTrue(np.allclose(csr.capital(), capital))
+
+    def test_fast_erdos_renyi_rng(self):
+        net = fast_erdos_renyi(50, 0.1, csr=True, rng=np.random.default_rng(2))
+        other = fast_erdos_renyi(50, 0.1, rng=np.random.default_rng(2))
+        self.assertEqual(net.number_of_links, other.number_of_links)
+        self.assertEqual(net.shock_random(np.random.default_rng(3)),
+                         list(other.banks).index(other.shock_random(np.random.default_rng(3))))
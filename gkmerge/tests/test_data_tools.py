@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+from gkmerge.data_tools.util import (
+    group_ids, greater_than, fraction, externally_filtered_mean, vectorized_fraction,
+    vectorized_externally_filtered_mean
+)
+from gkmerge.data_tools.data_analysis import (
+    cascade_statistics, contagion_frequency, contagion_extend, cascade_steps
+)
+
+
+class TestCascadeStatistics(unittest.TestCase):
+    def test_cascade_statistics(self):
+        rng = np.random.default_rng(0)
+        counts = [50, 0, 1, 200]
+        meta = dict(keys=[0.01, 0.02, 0.03, 0.04], offsets=np.cumsum([0] + counts).tolist())
+        df = rng.random(sum(counts)) ** 3
+        df[rng.random(len(df)) < 0.1] = np.nan
+        steps = rng.integers(1, 20, len(df)).astype(float)
+        steps[rng.random(len(df)) < 0.1] = np.nan
+        thresholds = [0, 0.05, 0.5, 1]
+        keys, ids = group_ids(meta)
+        stats = cascade_statistics(df, thresholds, ids, steps=steps, number_of_groups=len(keys))
+        for g, (lo, hi) in enumerate(zip(meta["offsets"], meta["offsets"][1:])):
+            dfs = [None if np.isnan(v) else v for v in df[lo:hi]]
+            for j, t in enumerate(thresholds):
+                self.assertAlmostEqual(stats["frequency"][g, j], contagion_frequency(dfs, t))
+                self.assertAlmostEqual(stats["extend"][g, j], contagion_extend(df[lo:hi], t))
+                self.assertAlmostEqual(stats["steps"][g, j], cascade_steps(steps[lo:hi], df[lo:hi], t))
+
+
+class TestFilters(unittest.TestCase):
+    def test_scalar_filters(self):
+        lst, filter_lst = [3, None, 1, 4, np.nan, 5], [0.1, 0.9, None, 0.6, 0.7, 0.2]
+        self.assertAlmostEqual(fraction(lst, greater_than), 1)
+        self.assertAlmostEqual(fraction(lst, lambda x: greater_than(x, 3)), 0.5)
+        self.assertAlmostEqual(
+            externally_filtered_mean(lst, filter_lst, lambda x: x is not None and greater_than(x, 0.5)), 4
+        )
+        self.assertAlmostEqual(vectorized_fraction(lst, lambda a: a > 3), 0.5)
+        self.assertAlmostEqual(vectorized_externally_filtered_mean(lst, filter_lst, lambda a: a > 0.5), 4)
@@ -0,0 +1,157 @@
+import unittest
+import numpy as np
+from gkmerge.csr_network import CSRNetwork
+from gkmerge.generators import (
+    init_balance_sheets_dcc, fast_erdos_renyi, bipartite_erdos_renyi, fast_bipartite_erdos_renyi,
+    directed_barabasi_albert, chung_lu, fast_chung_lu, _alias_table, _alias_sample, _chung_lu_weights
+)
+
+
+class TestFastErdosRenyi(unittest.TestCase):
+    def test_links(self):
+        rng = np.random.default_rng(0)
+        n, p = 200, 0.01
+        counts = np.zeros((n, n))
+        links = []
+        for _ in range(50):
+            net = fast_erdos_renyi(n, p, csr=True, rng=rng)
+            u, v, _ = net.link_arrays()
+            self.assertFalse(np.any(u == v))
+            counts[u, v] += 1
+            links.append(net.number_of_links)
+        # mean number of links within 4 standard deviations
+        expected = n * (n - 1) * p
+        self.assertLess(abs(np.mean(links) - expected), 4 * np.sqrt(expected / 50))
+        # links in all rows, columns and below / above the diagonal
+        self.assertTrue(np.all(counts.sum(axis=0) > 0) and np.all(counts.sum(axis=1) > 0))
+        self.assertGreater(np.tril(counts).sum(), 0)
+        self.assertGreater(np.triu(counts).sum(), 0)
+
+    def test_network(self):
+        net = fast_erdos_renyi(100, 0.05, alpha=0.2, kappa=0.04, rng=np.random.default_rng(1))
+        csr = fast_erdos_renyi(100, 0.05, alpha=0.2, kappa=0.04, csr=True, rng=np.random.default_rng(1))
+        index = {b: i for i, b in enumerate(net.banks)}
+        self.assertListEqual(sorted((index[u], index[v]) for u, v in net.links), csr.links)
+        self.assertTrue(np.allclose([b.capital() for b in net.banks], csr.capital()))
+
+
+class TestChungLu(unittest.TestCase):
+    def test_alias_table(self):
+        probs = np.array([0.5, 0.3, 0.15, 0.05])
+        samples = _alias_sample(_alias_table(probs), 100000, np.random.default_rng(0))
+        freqs = np.bincount(samples, minlength=4) / len(samples)
+        self.assertTrue(np.allclose(freqs, probs, atol=0.01))
+
+    def test_links(self):
+        for n, z, gamma in ((11, 1.5, 3), (200, 5, 3), (200, 20, 2.1)):
+            net = chung_lu(n, z, gamma=gamma, csr=True, rng=np.random.default_rng(1))
+            self.assertEqual(net.number_of_links, int(n * z))
+            u, v, _ = net.link_arrays()
+            self.assertFalse(np.any(u == v))
+            if n >= 100:
+                deg = net.in_degrees() + net.out_degrees()
+                self.assertGreater(deg[:n // 10].sum(), deg[-(n // 10):].sum())
+
+    def test_network(self):
+        net = chung_lu(100, 3, alpha=0.2, kappa=0.04, rng=np.random.default_rng(2))
+        csr = chung_lu(100, 3, alpha=0.2, kappa=0.04, csr=True, rng=np.random.default_rng(2))
+        index = {b: i for i, b in enumerate(net.banks)}
+        self.assertListEqual(sorted((index[u], index[v]) for u, v in net.links), csr.links)
+        self.assertTrue(np.allclose([b.capital() for b in net.banks], csr.capital()))
+
+    def test_too_many_links(self):
+        self.assertRaises(ValueError, chung_lu, 3, 3)
+
+
+class TestFastChungLu(unittest.TestCase):
+    def test_link_probabilities(self):
+        n, runs, rng = 100, 200, np.random.default_rng(0)
+        ws = _chung_lu_weights(n, 5, 3)
+        probs = np.minimum(np.outer(ws, ws) / np.sum(ws), 1)
+        np.fill_diagonal(probs, 0)
+        counts = np.zeros((n, n))
+        for _ in range(runs):
+            u, v, _ = fast_chung_lu(n, 5, gamma=3, csr=True, rng=rng).link_arrays()
+            self.assertFalse(np.any(u == v))
+            counts[u, v] += 1
+        # expected degrees within 4 standard deviations
+        self.assertTrue(np.all(
+            np.abs(counts.sum(axis=1) / runs - probs.sum(axis=1)) < 4 * np.sqrt(probs.sum(axis=1) / runs)
+        ))
+
+    def test_network(self):
+        net = fast_chung_lu(100, 4, alpha=0.2, kappa=0.04, c=0.3, rng=np.random.default_rng(2))
+        csr = fast_chung_lu(100, 4, alpha=0.2, kappa=0.04, c=0.3, csr=True, rng=np.random.default_rng(2))
+        index = {b: i for i, b in enumerate(net.banks)}
+        self.assertListEqual(sorted((index[u], index[v]) for u, v in net.links), csr.links)
+        self.assertTrue(np.allclose([b.capital() for b in net.banks], csr.capital()))
+        # common asset fraction c is kept
+        self.assertTrue(np.all(csr.field("assets_com") > 0))
+
+
+class TestInitBalanceSheetsDCC(unittest.TestCase):
+    def test_network_and_csr(self):
+        net = chung_lu(200, 3, gamma=2.5, rng=np.random.default_rng(0))
+        csr = CSRNetwork.from_network(net)
+        for args in ((0.3, 0.1, 0.2), (0.2, 0.04, 0.1)): # second call updates weights
+            init_balance_sheets_dcc(net, *args)
+            init_balance_sheets_dcc(csr, *args)
+        self.assertEqual(net.init_system_assets, csr.init_system_assets)
+        for i, b in enumerate(net.banks):
+            self.assertEqual(b.balance_sheet, csr.balance_sheet_of(i))
+            self.assertListEqual(
+                sorted(w for _, w in net.pres_of(b, weight=True)),
+                sorted(w for _, w in csr.pres_of(i, weight=True))
+            )
+
+
+class TestBipartite(unittest.TestCase):
+    def _check_balance_sheets(self, net, alpha, kappa):
+        for b in net.banks:
+            bs = b.balance_sheet
+            self.assertAlmostEqual(b.assets_tot(), 100)
+            self.assertAlmostEqual(bs["assets_com"], 100 * alpha if net.inv_deg_of(b) > 0 else 0)
+            self.assertAlmostEqual(sum(w for _, w in net.invs_of(b, weight=True)), bs["assets_com"])
+            self.assertAlmostEqual(bs["liabilities_e"], 100 * (1 - kappa))
+        self.assertEqual(net.init_system_assets, 100 * net.number_of_banks)
+
+    def test_bipartite_erdos_renyi(self):
+        net = bipartite_erdos_renyi(200, 20, 3, alpha=0.2, kappa=0.04, rng=np.random.default_rng(0))
+        self.assertEqual(net.number_of_investments, 600)
+        self.assertEqual(sum(net.inv_deg_of(b) for b in net.banks), 600)
+        self._check_balance_sheets(net, 0.2, 0.04)
+
+    def test_fast_bipartite_erdos_renyi(self):
+        rng = np.random.default_rng(1)
+        invests = [fast_bipartite_erdos_renyi(200, 20, 3, rng=rng).number_of_investments for _ in range(20)]
+        self.assertLess(abs(np.mean(invests) - 600), 4 * np.sqrt(600 / 20))
+        net = fast_bipartite_erdos_renyi(200, 20, 3, alpha=0.3, kappa=0.1, rng=rng)
+        self._check_balance_sheets(net, 0.3, 0.1)
+
+
+class TestDirectedBarabasiAlbert(unittest.TestCase):
+    def test_links(self):
+        n, m, d, io = 2000, 3, 0.3, 0.2
+        net = directed_barabasi_albert(n, m, d=d, io=io, csr=True, rng=np.random.default_rng(0))
+        u, v, _ = net.link_arrays()
+        links = set(zip(u.tolist(), v.tolist()))
+        new = np.maximum(u, v) > m
+        # every new node is linked to m distinct older nodes
+        older = np.bincount(np.maximum(u, v)[new], minlength=n)
+        bidirectional = np.array([(b, a) in links for a, b in zip(u.tolist(), v.tolist())])[new]
+        older -= np.bincount(np.maximum(u, v)[new][bidirectional], minlength=n) // 2
+        self.assertTrue(np.all(older[m + 1:] == m))
+        # link directions
+        pairs = (n - m - 1) * m
+        self.assertLess(abs(bidirectional.sum() / 2 / pairs - io), 0.02)
+        outward = np.count_nonzero((u > v)[new] & ~bidirectional)
+        self.assertLess(abs(outward / pairs - (d - io)), 0.02)
+        # preferential attachment
+        self.assertGreater(net.in_degrees()[:m + 1].mean(), 5 * net.in_degrees().mean())
+
+    def test_network(self):
+        net = directed_barabasi_albert(200, 2, alpha=0.2, kappa=0.04, rng=np.random.default_rng(1))
+        csr = directed_barabasi_albert(200, 2, alpha=0.2, kappa=0.04, csr=True, rng=np.random.default_rng(1))
+        index = {b: i for i, b in enumerate(net.banks)}
+        self.assertListEqual(sorted((index[u], index[v]) for u, v in net.links), csr.links)
+        self.assertEqual(net.init_system_assets, csr.init_system_assets)
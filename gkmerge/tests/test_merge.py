@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+from gkmerge.generators import fast_erdos_renyi
+from gkmerge.util import sample_unique_pair
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.net = fast_erdos_renyi(200, 0.03, alpha=0.2, kappa=0.04, c=0.2, rng=np.random.default_rng(0))
+
+    def test_merge(self):
+        net = self.net
+        b, d = list(net.banks)[:2]
+        net.add_or_update_link(b, d, weight=3)
+        net.add_or_update_link(d, b, weight=5)
+        bs_b, bs_d = dict(b.balance_sheet), dict(d.balance_sheet)
+        neighbors = {nb: dict(nb.balance_sheet) for nb in set(net.sucs_of(d)) | set(net.pres_of(d))}
+        common = set(net.sucs_of(b)) & set(net.sucs_of(d))
+        expected = {suc: net.get_link_weight(b, suc) + net.get_link_weight(d, suc) for suc in common}
+        a_tot = b.assets_tot() + d.assets_tot()
+        init_system_assets = net.init_system_assets
+        self.assertIs(net.merge(b, d), b)
+        self.assertNotIn(d, net.banks)
+        for f in ("assets_ib", "liabilities_ib"):
+            self.assertAlmostEqual(b.balance_sheet[f], bs_b[f] + bs_d[f] - 8)
+        for f in ("assets_e", "assets_com", "liabilities_e"):
+            self.assertEqual(b.balance_sheet[f], bs_b[f] + bs_d[f])
+        for nb, bs in neighbors.items():
+            if nb is not b:
+                self.assertEqual(dict(nb.balance_sheet), bs)
+        for suc, w in expected.items():
+            self.assertEqual(net.get_link_weight(b, suc), w)
+            self.assertEqual(net._pres[suc][b], w)
+        self.assertFalse(net.is_suc(b, b))
+        self.assertAlmostEqual(net.init_system_assets, init_system_assets - a_tot + b.assets_tot())
+        self.assertEqual(net.number_of_links, len(net.links))
+
+    def test_get_largest(self):
+        rng = np.random.default_rng(2)
+        for i in range(150):
+            rule = "vertical" if i % 3 == 0 else "random"
+            self.net.random_merge(rule, rng=rng)
+            largest = self.net.get_largest()
+            # first bank in iteration order with maximal merge_state
+            self.assertIs(largest, max(self.net.banks, key=lambda b: b.merge_state))
+
+    def test_degree_index(self):
+        net, rng = self.net, np.random.default_rng(3)
+        def check():
+            banks = list(net.banks)
+            for deg, highest, kth in (
+                (net.in_deg_of, net.get_highest_in_deg, net.get_kth_highest_in_deg),
+                (net.out_deg_of, net.get_highest_out_deg, net.get_kth_highest_out_deg)
+            ):
+                self.assertIs(highest(), max(banks, key=deg))
+                ranked = sorted(banks, key=deg)
+                for k in (1, 2, 5, len(banks)):
+                    self.assertIs(kth(k), ranked[-k])
+        check()
+        for i in range(100):
+            if i % 4 == 0:
+                u, v = sample_unique_pair(net.banks, rng)
+                net.add_or_update_link(u, v, weight=1)
+            elif i % 4 == 1 and net.links:
+                net.remove_link(*net.links[0])
+            elif i % 4 == 2:
+                net.remove_bank(net.get_highest_in_deg())
+            else:
+                net.random_merge("random", rng=rng)
+            check()
+        banks = list(net.banks)
+        pairs = {
+            (i, j) for i, j in rng.integers(len(banks), size=(200, 2)).tolist()
+            if i != j and not net.is_suc(banks[i], banks[j])
+        }
+        u, v = np.array(sorted(pairs)).T
+        net.add_index_links(banks, u, v, weight=1)
+        check()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from gkmerge.simulation import (
+    ContagionWindow, ContinousMergers, merge_shards, load_jsonl, jsonl_to_columns
+)
+from gkmerge.data_tools.util import load_columns, per_key
+from gkmerge.data_tools.data_analysis import contagion_frequency, cascade_steps
+
+
+class TestSimulation(unittest.TestCase):
+    def test_contagion_window_workers(self):
+        sims = []
+        for workers in (None, 2):
+            sim = ContagionWindow(seed=3)
+            sim.use_erdos_renyi(n=60, p_min=0.01, p_max=0.04, p_points=3, runs=4)
+            sim.run(workers=workers)
+            sims.append(sim)
+        self.assertEqual(sims[0].data, sims[1].data)
+        self.assertEqual([len(v) for v in sims[0].data.values()], [4, 4, 4])
+
+    def test_shocks_per_network(self):
+        for csr in (False, True):
+            sim = ContagionWindow(seed=4)
+            sim.use_erdos_renyi(n=60, p_min=0.01, p_max=0.04, p_points=2, runs=5, shocks_per_network=2, csr=csr)
+            sim.run()
+            self.assertEqual([len(v) for v in sim.data.values()], [5, 5])
+            # shocks on the same network share its mean degree
+            for runs in sim.data.values():
+                self.assertEqual(runs[0]["z"], runs[1]["z"])
+
+    def test_continous_mergers_workers(self):
+        sims = []
+        for workers in (None, 2):
+            sim = ContinousMergers(seed=5)
+            sim.use_erdos_renyi(n=40, p=0.05, mr_max=10, mr_points=2, runs=3)
+            sim.run(workers=workers)
+            sims.append(sim)
+        self.assertEqual(sims[0].data, sims[1].data)
+        self.assertListEqual(list(sims[0].data), [0, 5, 10])
+
+    def test_merge_shards(self):
+        with tempfile.TemporaryDirectory() as path:
+            for shard_index in (None, 0, 1, 2):
+                sim = ContagionWindow(write_path=path, seed=11)
+                sim.use_erdos_renyi(n=50, p_min=0.01, p_max=0.03, p_points=2, runs=4)
+                if shard_index is None:
+                    sim.run_and_write("single")
+                else:
+                    sim.run_and_write(f"shard{shard_index}", shard_index=shard_index, num_shards=3)
+            merge_shards(
+                [os.path.join(path, f"shard{i}.json") for i in (2, 0, 1)],
+                os.path.join(path, "merged.json")
+            )
+            with open(os.path.join(path, "single.json")) as f:
+                single = f.read()
+            with open(os.path.join(path, "merged.json")) as f:
+                self.assertEqual(f.read(), single)
+
+    def test_shards_need_seed(self):
+        sim = ContagionWindow()
+        sim.use_erdos_renyi(n=10, p_points=2, runs=2)
+        self.assertRaises(ValueError, sim.run, shard_index=0, num_shards=2)
+
+    def test_run_and_stream(self):
+        with tempfile.TemporaryDirectory() as path:
+            sim = ContagionWindow(write_path=path, seed=12)
+            sim.use_erdos_renyi(n=50, p_min=0.01, p_max=0.03, p_points=2, runs=4)
+            sim.run()
+            for shard_index in (0, 1):
+                streamed = ContagionWindow(write_path=path, seed=12)
+                streamed.use_erdos_renyi(n=50, p_min=0.01, p_max=0.03, p_points=2, runs=4)
+                streamed.run_and_stream(f"shard{shard_index}", shard_index=shard_index, num_shards=2, buffer_size=3)
+            attributes, data = load_jsonl([os.path.join(path, f"shard{i}.jsonl") for i in (1, 0)])
+            self.assertEqual(attributes, sim.attr)
+            self.assertEqual(data, sim.data)
+            # an interrupted run keeps all complete lines
+            file_path = os.path.join(path, "shard0.jsonl")
+            with open(file_path) as f:
+                content = f.read()
+            with open(file_path, "w") as f:
+                f.write(content[:-10])
+            _, data = load_jsonl(file_path)
+            self.assertEqual([len(v) for v in data.values()], [3, 0])
+
+    def test_continous_mergers_stream(self):
+        with tempfile.TemporaryDirectory() as path:
+            sim = ContinousMergers(write_path=path, seed=5)
+            sim.use_erdos_renyi(n=40, p=0.05, mr_max=10, mr_points=2, runs=3)
+            sim.run_and_stream("mergers", workers=2, buffer_size=2)
+            self.assertEqual(sim.data, {0: [], 5: [], 10: []})
+            _, data = load_jsonl(os.path.join(path, "mergers.jsonl"))
+            sim.run()
+            self.assertEqual(data, sim.data)
+
+    def test_columns(self):
+        with tempfile.TemporaryDirectory() as path:
+            sim = ContagionWindow(write_path=path, seed=13)
+            sim.use_erdos_renyi(n=50, p_min=0.01, p_max=0.05, p_points=3, runs=6)
+            sim.run_and_stream("runs", buffer_size=4)
+            jsonl_to_columns(os.path.join(path, "runs.jsonl"), os.path.join(path, "streamed"))
+            sim.run()
+            sim.write_columns("columns")
+            for dir_name in ("columns", "streamed"):
+                meta, columns = load_columns(os.path.join(path, dir_name))
+                self.assertIsInstance(columns["df"], np.memmap)
+                self.assertEqual(meta["attributes"], sim.attr)
+                self.assertEqual(meta["keys"], list(sim.data))
+                for f in ("df", "af", "z", "steps"):
+                    self.assertEqual(
+                        per_key(list, meta, columns[f]),
+                        {k: [r[f] for r in runs] for k, runs in sim.data.items()}
+                    )
+                for threshold in (0, 0.05):
+                    freq = per_key(contagion_frequency, meta, columns["df"], cascade_threshold=threshold)
+                    steps = per_key(cascade_steps, meta, columns["steps"], columns["df"], cascade_threshold=threshold)
+                    for k, runs in sim.data.items():
+                        dfs = [r["df"] for r in runs]
+                        self.assertAlmostEqual(freq[k], contagion_frequency(dfs, threshold))
+                        self.assertAlmostEqual(steps[k], cascade_steps([r["steps"] for r in runs], dfs, threshold))
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as path:
+            file_path = os.path.join(path, "mergers.jsonl")
+            sim = ContinousMergers(write_path=path, seed=6)
+            sim.use_erdos_renyi(n=40, p=0.05, mr_max=10, mr_points=2, runs=4)
+            sim.run_and_stream("mergers", buffer_size=2)
+            with open(file_path) as f:
+                content = f.read()
+            # cut within a line, at the end of a unit and within a unit
+            for size in (len(content) // 2, content.index('{"unit": 2'), len(content) - 5):
+                with open(file_path, "w") as f:
+                    f.write(content[:size])
+                resumed = ContinousMergers(write_path=path)
+                resumed.use_erdos_renyi(n=40, p=0.05, mr_max=10, mr_points=2, runs=4)
+                resumed.run_and_stream("mergers", resume=True)
+                self.assertEqual(resumed.attr["seed"], 6)
+                with open(file_path) as f:
+                    self.assertEqual(f.read(), content)
+            other = ContinousMergers(write_path=path, seed=7)
+            other.use_erdos_renyi(n=40, p=0.05, mr_max=10, mr_points=2, runs=4)
+            self.assertRaises(ValueError, other.run_and_stream, "mergers", resume=True)
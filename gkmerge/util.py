@@ -6,21 +6,43 @@ from gkmerge.bank import Bank
 logger = logging.getLogger(__name__)
 
 
-def sample_unique_pair(rd: RandomDict):
+def random_key(rd: RandomDict, rng=None):
+    """
+    Random key of rd in O(1) time. Drawn from the numpy Generator rng if
+    given, else from the random module (as RandomDict.random_key).
+    """
+    if rng is None:
+        return rd.random_key()
+    if len(rd) == 0:
+        raise KeyError("RandomDict is empty")
+    return rd.values[int(rng.integers(len(rd)))][0]
+
+
+def randrange(n, rng=None):
+    """
+    Random integer in range(n), drawn from the numpy Generator rng if given,
+    else from the random module.
+    """
+    if rng is None:
+        return random.randrange(n)
+    return int(rng.integers(n))
+
+
+def sample_unique_pair(rd: RandomDict, rng=None):
     if len(rd) < 2:
         raise ValueError("Need RandomDict of length 2 or more!")
-    b, d = rd.random_key(), rd.random_key()
+    b, d = random_key(rd, rng), random_key(rd, rng)
     while b == d:
-        d = rd.random_key()
+        d = random_key(rd, rng)
     return b, d
 
 
-def sample_except(rd: RandomDict, exclude):
+def sample_except(rd: RandomDict, exclude, rng=None):
     if len(rd) < 2:
         raise ValueError("Need RandomDict of length 2 or more!")
-    b = rd.random_key()
+    b = random_key(rd, rng)
     while b == exclude:
-        b = rd.random_key()
+        b = random_key(rd, rng)
     return b
 
 
@@ -32,14 +54,17 @@ def _pairs(l):
     return [l[i::n] for i in range(0, n)]
 
 
-def random_pairs(rd: RandomDict):
+def random_pairs(rd: RandomDict, rng=None):
     """
     Returns list of tuples of rd's keys
     """
     if len(rd) % 2 != 0 or len(rd) == 0:
         raise ValueError("Need RandomDict of even length!")
     rd_lst = list(rd)
-    random.shuffle(rd_lst)
+    if rng is None:
+        random.shuffle(rd_lst)
+    else:
+        rd_lst = [rd_lst[i] for i in rng.permutation(len(rd_lst))]
     return _pairs(rd_lst)
 
 
@@ -54,12 +79,15 @@ def insert_dict(insert_to, insert_from):
             insert_to[k] = v
 
 
-def random_subset(seq, n):
+def random_subset(seq, n, rng=None):
     """
     Return n unique elements from seq.
     """
     res = set()
     while len(res) < n:
-        x = random.choice(seq)
+        if rng is None:
+            x = random.choice(seq)
+        else:
+            x = seq[int(rng.integers(len(seq)))]
         res.add(x)
     return res